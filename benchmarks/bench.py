@@ -0,0 +1,327 @@
+"""
+super ini benchmarks
+--------------------
+
+generates super ini corpora of increasing size, and times each
+phase of their compilation
+
+    bench.py [options]
+
+options:
+
+    --sizes N,N,...  number of keys of each corpus (default 10000,100000,1000000)
+                     or `large` to add a corpus of 10000000 keys
+    --keys N         keys per scope (default 10)
+    --files N        included files each corpus is split in (default 8)
+    --seed N         seed of the generator (default 0)
+    --output FILE    save the results as json to FILE
+    --compare FILE   compare the results with json results saved by --output
+"""
+
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from collections import OrderedDict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import super_ini  # noqa: E402
+
+# corpus sizes selected by name with --sizes, the large corpus
+# takes several minutes and gigabytes of memory to compile
+SIZES = {
+    'default': '10000,100000,1000000',
+    'large': '10000,100000,1000000,10000000',
+}
+
+# phases timed while parsing, mapped to the function they time,
+# the time of nested phases is not counted twice:
+# `call_closures` does not include the time spent parsing the
+# files included by an include closure
+PHASES = OrderedDict([
+    ('build', (super_ini, 'build')),
+    ('resolve_references', (super_ini, 'resolve_references')),
+    ('check_types', (super_ini, 'check_types')),
+    ('call_closures', (super_ini.Scope, 'call_closures')),
+])
+
+# typed values generated for plain keys
+TYPED = (
+    ('i32', lambda r: str(r.randint(-2 ** 31, 2 ** 31 - 1))),
+    ('u8', lambda r: str(r.randint(0, 255))),
+    ('f32', lambda r: '{0:.3f}'.format(r.uniform(-1e3, 1e3))),
+    ('bool', lambda r: r.choice(('True', 'False'))),
+    ('str', lambda r: 'item_{0}'.format(r.randint(0, 1 << 16))),
+    ('', lambda r: 'untyped value {0}'.format(r.randint(0, 1 << 16))),
+)
+
+
+def generate_scope(out: list, rnd: random.Random, file_id: int,
+                   index: int, keys: int):
+    """appends the lines of a generated scope, the kind of scope
+    depends on its index so every corpus has the same mix:
+
+        plain typed keys, `::` references to the previous scope,
+        typed literals and expressions in `eval` scopes, `inline`
+        and `as` implementations of the file's abstract scope, and
+        multiline values
+    """
+    name = 'S{0}_{1}'.format(file_id, index)
+    kind = index % 8
+    first = 0
+
+    if kind == 1 and index > 0:
+        # references to the previous scope
+        out.append('[{0}]'.format(name))
+        for k in range(keys):
+            out.append('r{0} = S{1}_{2}::k{3} ref'.format(
+                k, file_id, index - 1, k))
+        return
+
+    if kind == 2:
+        # types are checked before and after evaluation, so typed
+        # values are literals that evaluate to the same type, and
+        # arithmetic expressions are untyped
+        out.append('[{0}] :: eval'.format(name))
+        for k in range(keys):
+            if k % 3 == 0:
+                out.append('k{0}: i64 = {1:#x}'.format(
+                    k, rnd.randint(0, 2 ** 63 - 1)))
+            elif k % 3 == 1:
+                out.append('k{0}: f64 = {1:.3e}'.format(
+                    k, rnd.uniform(-1e6, 1e6)))
+            else:
+                out.append('k{0} = {1} * {2} + {3}'.format(
+                    k, rnd.randint(1, 99), rnd.randint(1, 99), k))
+        return
+
+    if kind == 3:
+        out.append('[{0}] :: inline :Abstract{1}'.format(name, file_id))
+    elif kind == 4:
+        out.append('[{0}] :: as :Abstract{1}'.format(name, file_id))
+    else:
+        out.append('[{0}]'.format(name))
+
+    if kind in (3, 4):
+        out.append('damage: i32 = {0}'.format(rnd.randint(1, 999)))
+        out.append('level: u8 = {0}'.format(rnd.randint(1, 99)))
+        first = 2
+
+    for k in range(first, keys):
+        if kind == 5 and k == first:
+            # multiline value
+            out.append('k{0} ='.format(k))
+            out.append('    first line of a multiline value')
+            out.append('    second line of a multiline value')
+            continue
+        value_type, value = TYPED[rnd.randrange(len(TYPED))]
+        if value_type:
+            out.append('k{0}: {1} = {2}'.format(k, value_type, value(rnd)))
+        else:
+            out.append('k{0} = {1}'.format(k, value(rnd)))
+
+
+def generate(directory: str, keys: int, keys_per_scope: int = 10,
+             files: int = 8, seed: int = 0) -> str:
+    """writes a corpus of about `keys` keys to directory, split in
+    `files` included files, returns the path of the root file
+    """
+    rnd = random.Random(seed)
+    scopes = max(1, keys // keys_per_scope // files)
+    includes = []
+
+    for file_id in range(files):
+        path = os.path.join(directory, 'part{0}.ini'.format(file_id))
+        includes.append(':' + path)
+        out = ['[Abstract{0}] :: abstract :damage :level'.format(file_id)]
+        for index in range(scopes):
+            generate_scope(out, rnd, file_id, index, keys_per_scope)
+        with open(path, 'w') as f:
+            f.write('\n'.join(out))
+            f.write('\n')
+
+    root = os.path.join(directory, 'root.ini')
+    with open(root, 'w') as f:
+        f.write('[] :: internal, setenv\nsnapshots = False\n\n')
+        f.write('[] :: internal, include {0}\n'.format(' '.join(includes)))
+    return root
+
+
+class PhaseTimer:
+    """times wrapped functions, excluding the time
+    spent in other wrapped functions they call
+    """
+    def __init__(self):
+        self.times = OrderedDict((phase, 0.0) for phase in PHASES)
+        self.stack = []
+
+    def wrap(self, phase: str, function):
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            self.stack.append(0.0)
+            try:
+                return function(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                nested = self.stack.pop()
+                self.times[phase] += elapsed - nested
+                if self.stack:
+                    self.stack[-1] += elapsed
+        return timed
+
+    def install(self):
+        for phase, (owner, name) in PHASES.items():
+            setattr(owner, name, self.wrap(phase, getattr(owner, name)))
+
+
+def run_one(keys: int, keys_per_scope: int, files: int, seed: int) -> dict:
+    """generates and compiles one corpus, returns its results"""
+    with tempfile.TemporaryDirectory() as directory:
+        start = time.perf_counter()
+        root = generate(directory, keys, keys_per_scope, files, seed)
+        generated = time.perf_counter() - start
+        lines = 0
+        for name in os.listdir(directory):
+            with open(os.path.join(directory, name), 'r') as f:
+                lines += sum(1 for _ in f)
+
+        timer = PhaseTimer()
+        timer.install()
+        compiler = super_ini.Compiler()
+
+        start = time.perf_counter()
+        lut = compiler.parse(root)
+        parsed = time.perf_counter() - start
+
+        phases = OrderedDict(timer.times)
+        phases['other'] = parsed - sum(timer.times.values())
+
+        with compiler:
+            for name, (compile_to, mode) in super_ini.FORMATS.items():
+                path = os.path.join(directory, 'out.' + name)
+                start = time.perf_counter()
+                with open(path, mode) as f:
+                    compile_to(lut, f)
+                phases['compile_' + name] = time.perf_counter() - start
+
+        stats = super_ini.get_stats(lut)
+
+    total = sum(phases.values())
+    return {
+        'keys': stats['keys'],
+        'scopes': stats['objects'],
+        'files': files,
+        'generate': generated,
+        'phases': phases,
+        'total': total,
+        'keys_per_sec': dict((phase, stats['keys'] / t if t else None)
+                             for phase, t in phases.items()),
+        'total_keys_per_sec': stats['keys'] / total,
+        'lines': lines,
+        'build_lines_per_sec': lines / phases['build'],
+        # kilobytes on linux
+        'peak_rss_kib': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+            stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: dict, previous: dict):
+    """prints the ratio of each phase time to the previous results"""
+    before = dict((r['keys'], r) for r in previous['results'])
+    print('\ncompared to {0}:'.format(previous.get('revision')))
+
+    for result in results['results']:
+        old = before.get(result['keys'])
+        if old is None:
+            continue
+        ratios = ['{0} {1:.2f}x'.format(phase, t / old['phases'][phase])
+                  for phase, t in result['phases'].items()
+                  if old['phases'].get(phase)]
+        print('{0:>10} keys: total {1:.2f}x, {2}'.format(
+            result['keys'], result['total'] / old['total'], ', '.join(ratios)))
+
+
+def report(result: dict):
+    print('{0:>10} keys {1:>8.2f}s {2:>10.0f} keys/s {3:>10.0f} lines/s '
+          '{4:>8.1f} MiB  {5}'.format(
+              result['keys'], result['total'], result['total_keys_per_sec'],
+              result['build_lines_per_sec'], result['peak_rss_kib'] / 1024,
+              ', '.join(
+                  '{0} {1:.2f}s'.format(phase, t)
+                  for phase, t in result['phases'].items())))
+    sys.stdout.flush()
+
+
+def main(args):
+    if len(args) > 0 and args[0] in ('-h', '--help'):
+        print(__doc__)
+        return
+
+    options = {
+        'sizes': 'default',
+        'keys': '10',
+        'files': '8',
+        'seed': '0',
+        'output': None,
+        'compare': None,
+        'run-one': None,
+    }
+    args = iter(args)
+    for arg in args:
+        if not arg.startswith('--') or arg[2:] not in options:
+            sys.exit('unknown option ' + arg)
+        options[arg[2:]] = next(args, None)
+
+    keys, files, seed = (int(options[k]) for k in ('keys', 'files', 'seed'))
+
+    if options['run-one'] is not None:
+        # run by the parent process, so the peak memory
+        # of each corpus is measured on its own
+        print(json.dumps(run_one(int(options['run-one']), keys, files, seed)))
+        return
+
+    results = {
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'keys_per_scope': keys,
+        'seed': seed,
+        'results': [],
+    }
+
+    sizes = SIZES.get(options['sizes'], options['sizes'])
+    for size in sizes.split(','):
+        output = subprocess.check_output([
+            sys.executable, os.path.abspath(__file__), '--run-one', size,
+            '--keys', str(keys), '--files', str(files), '--seed', str(seed)])
+        result = json.loads(output.decode().splitlines()[-1])
+        results['results'].append(result)
+        report(result)
+
+    if options['output']:
+        with open(options['output'], 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if options['compare']:
+        with open(options['compare'], 'r') as f:
+            compare(results, json.load(f))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
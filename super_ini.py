@@ -4,7 +4,31 @@
 
 compiles super_ini --> ini
 
-    super_ini.py [input_path] [output_path]
+    super_ini.py [options] [input_path] [output_path]
+
+options:
+
+    --cache DIR    reuse compiled output stored in DIR when the input,
+                   included files and environment have not changed
+    -j, --jobs N   parse included files in N worker processes
+    --format FMT   output format, `ini` (default), `bin`, `cols` to
+                   export abstract scopes as columnar tables, or `py`
+                   and `marshal` to write the scopes as python dicts
+    --watch        recompile whenever the input or an included file changes
+    --batch FILE   compile every `input_path [output_path]` line of FILE,
+                   followed by the input/output pairs given as arguments
+    --serve PATH   compile requests received over a unix socket at PATH
+    --connect PATH send the compile request to the server at PATH
+    --profile      print the time spent in each phase, closure and file
+    --profile-output FILE
+                   also write the profile as json, which can be opened
+                   as a trace in chrome://tracing or Perfetto
+    --memory       profile the memory used by each phase, and print
+                   the memory used by each scope, file and class
+    --only SCOPES  only compile the comma separated SCOPES, and the
+                   scopes and included files they depend on
+    --delta FILE   also compile the scopes that changed since the
+                   output file was last compiled to FILE
 """
 
 # Syntax Terminology
@@ -67,12 +91,123 @@ compiles super_ini --> ini
 #       ; can also be written as
 #       damage :i32 = 355
 
+import array
+import ast
+import asyncio
+import builtins
+import contextlib
+import contextvars
+import filecmp
+import functools
+import hashlib
+import io
+import json
+import marshal
+import math
+import mmap
+import operator
+import os
+import re
+import shutil
+import signal
+import socket
+import struct
 import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import zlib
 
 from collections import OrderedDict
-
-env_flags = {'sorted': False}
-extern_parsed = []
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+try:
+    # peak memory of the process, only available on unix
+    import resource
+except ImportError:
+    resource = None
+
+# compiler of the compilation running in the current thread or
+# asyncio task, see `Compiler`
+active_compiler = contextvars.ContextVar('active_compiler', default=None)
+
+# paths of parsed files, values keep the index of their
+# path in this list instead of a reference to a Trace object
+trace_paths = []
+trace_files = {}
+trace_lock = threading.Lock()
+
+# number of compiled lines buffered before they are written out
+COMPILE_BUFFER_SIZE = 4096
+
+# default compile cache limits, can be changed with the
+# `cache_max_size` (bytes) and `cache_max_age` (seconds) env flags
+CACHE_MAX_SIZE = 256 * 1024 * 1024
+CACHE_MAX_AGE = 7 * 24 * 60 * 60
+
+# number of compiled expressions kept in memory by the eval closure
+EVAL_CACHE_SIZE = 4096
+
+# builtins available to expressions in eval scopes
+EVAL_BUILTINS = dict((name, getattr(builtins, name)) for name in (
+    'abs', 'all', 'any', 'bin', 'bool', 'chr', 'divmod', 'float', 'hex',
+    'int', 'len', 'max', 'min', 'oct', 'ord', 'pow', 'print', 'range',
+    'round', 'sorted', 'str', 'sum', 'tuple', 'list'))
+
+# look up table snapshots of included files are stored in this
+# directory, next to the included file, change the magic number
+# whenever the layout returned by `dump_lut` or `dump_warnings` changes
+SNAPSHOT_DIR = '__inicache__'
+SNAPSHOT_MAGIC = b'SINI\x02'
+
+# fingerprints of the scopes compiled to an output file are stored in
+# SNAPSHOT_DIR next to the output file, change the magic number
+# whenever the digests returned by `scope_fingerprints` change
+FINGERPRINT_MAGIC = b'SINF\x01'
+
+# first bytes of files compiled to the marshal format, change the
+# magic number whenever the layout of `compile_marshal` changes
+MARSHAL_MAGIC = b'SINM\x01'
+
+# command line options that take a value, mapped to the env flag they set
+OPTIONS = {
+    '--cache': 'cache',
+    '-j': 'jobs',
+    '--jobs': 'jobs',
+    '--format': 'format',
+    '--batch': 'batch',
+    '--serve': 'serve',
+    '--connect': 'connect',
+    '--profile-output': 'profile_output',
+    '--only': 'only',
+    '--delta': 'delta',
+}
+
+# env flags set by command line options, or by setenv,
+# that must be positive integers
+INTEGER_OPTIONS = ('jobs',)
+
+# command line options that do not take a value,
+# mapped to the env flag they set to True
+FLAGS = {
+    '--watch': 'watch',
+    '--profile': 'profile',
+    '--memory': 'memory',
+}
+
+# seconds between checks for changed files in watch mode, can
+# be changed with the `watch_interval` env flag
+WATCH_INTERVAL = 0.5
+
+# number of included files kept in memory by a compile server,
+# can be changed with the `serve_cache_size` env flag
+SERVE_CACHE_SIZE = 1024
+
+# number of scopes and keys listed in a profile, can be
+# changed with the `profile_top` env flag
+PROFILE_TOP = 10
 
 
 class Term:
@@ -96,6 +231,12 @@ class Err:
     EVAL_ERROR = ('E07', 'python evaluation error:')
     NO_INPUT = ('E08', 'missing input file')
     NO_OUTPUT = ('E09', 'missing output file')
+    OPTION_ARGUMENT = ('E10', 'missing value for option')
+    INCLUDE_CYCLE = ('E11', 'circular include:')
+    REFERENCE_CYCLE = ('E12', 'circular reference:')
+    UNDEFINED_FORMAT = ('E13', 'undefined output format:')
+    NO_SERVER = ('E14', 'could not connect to compile server')
+    OPTION_VALUE = ('E15', 'expected a positive integer for option')
 
 
 class Warn:
@@ -103,6 +244,7 @@ class Warn:
     UNDEFINED_KEY_REFERENCE = ('W01', 'could not look up key reference')
     MULTIPLE_ASSIGNMENT = ('W02', 'multiple assignments in one statement')
     EMPTY_STRUCT = ('W03', 'empty abstract scope declaration')
+    UNDEFINED_SCOPE = ('W04', 'requested scope is not defined:')
 
 
 class Trace:
@@ -110,6 +252,8 @@ class Trace:
     Trace objects are used as a way to keep track of where
     parsed objects are located in the original source.
     """
+    __slots__ = ('path', 'line', 'scope', 'key')
+
     def __init__(self, path: str, line: int, scope: str, key: str):
         self.path = path
         self.line = line
@@ -127,23 +271,72 @@ class Trace:
         return tstr
 
 
-def fail(error: tuple, trace: Trace = None, extra: str = ''):
-    print('{0}{1}error[{2}]:{3} {4} {5}'.format(
-          Term.FAIL, Term.BOLD, error[0], Term.ENDC, error[1], extra))
+def file_version(path: str) -> tuple:
+    """returns the (modification time, size) of a file"""
+    st = os.stat(path)
+    return (st.st_mtime_ns, st.st_size)
 
-    if trace:
-        print(trace)
-    print()
-    exit(-1)
 
+def trace_file(path: str) -> int:
+    """returns the index of a path in `trace_paths`"""
+    index = trace_files.get(path)
+    if index is None:
+        with trace_lock:
+            if path not in trace_files:
+                trace_paths.append(sys.intern(path))
+                trace_files[path] = len(trace_paths) - 1
+            index = trace_files[path]
+    return index
 
-def warn(warning: tuple, trace: Trace = None, extra: str = ''):
-    print('{0}{1}warning[{2}]:{3} {4} {5}'.format(
-          Term.WARN, Term.BOLD, warning[0], Term.ENDC, warning[1], extra))
 
-    if trace:
-        print(trace)
-    print()
+class Diagnostic:
+    """
+    An error or warning reported during a compilation, with the
+    code and message of an `Err` or `Warn` report and a copy of
+    the trace where it was reported
+    """
+    __slots__ = ('level', 'code', 'message', 'trace', 'extra')
+
+    def __init__(self, level: str, report: tuple,
+                 trace: Trace = None, extra: str = ''):
+        self.level = level
+        self.code, self.message = report
+        self.trace = trace.copy() if trace else None
+        self.extra = extra
+
+    def __str__(self) -> str:
+        dstr = '{0}[{1}]: {2} {3}'.format(
+            self.level, self.code, self.message, self.extra)
+        if self.trace:
+            dstr += '\n  --> {0}:{1} [{2}]'.format(
+                self.trace.path, self.trace.line, self.trace.scope)
+        return dstr
+
+    def __repr__(self) -> str:
+        color = Term.FAIL if self.level == 'error' else Term.WARN
+        dstr = '{0}{1}{2}[{3}]:{4} {5} {6}'.format(
+            color, Term.BOLD, self.level, self.code, Term.ENDC,
+            self.message, self.extra)
+        if self.trace:
+            dstr += '\n' + repr(self.trace)
+        return dstr + '\n'
+
+
+class CompileError(Exception):
+    """raised by `fail`, holds the Diagnostic of the error"""
+    def __init__(self, diagnostic: Diagnostic):
+        super().__init__(str(diagnostic))
+        self.diagnostic = diagnostic
+
+
+def fail(error: tuple, trace: Trace = None, extra: str = ''):
+    """reports an error to the active compiler, and raises it"""
+    raise CompileError(context().report('error', error, trace, extra))
+
+
+def warn(warning: tuple, trace: Trace = None, extra: str = ''):
+    """reports a warning to the active compiler"""
+    context().report('warning', warning, trace, extra)
 
 
 class Token:
@@ -162,21 +355,102 @@ class Token:
     DOT_OPERATOR = '.'
     SYMBOL_DEFINITION = ':'
     SCOPE_RESOLUTION_OPERATOR = '::'
-    ILLEGAL_NAME_CHARS = '=,:\\'
+    # a reference is a sequence of characters between
+    # spaces that contains a SCOPE_RESOLUTION_OPERATOR
+    REFERENCE = re.compile('[^ ]*::[^ ]*')
+    ILLEGAL_NAME = re.compile('[=,:\\\\]')
+
+
+class Lex:
+    """
+    Kinds of the tokens emitted by `lex`
+
+    Lines are classified by their first character once comments and
+    indentation are removed, `[` starts a scope header, and other
+    lines are key, value pairs when they contain a VALUE_SEPARATOR,
+    otherwise symbols (`:`) or the continuation of a value (indented)
+    """
+    SCOPE = 0
+    PAIR = 1
+    SYMBOLS = 2
 
 
 class Value:
+    """
+    Values are compiled into a template when they are created,
+    the template is a list of literal str chunks and (scope, key)
+    reference slots
+
+        damage = constants::max_damage dmg
+
+    has the template
+
+        [('constants', 'max_damage'), ' dmg']
+
+    values without references have no template (None)
+
+    Values do not keep a Trace object, only the index of the source
+    file in `trace_paths`, the line and the scope id are stored, the
+    Trace object is created when an error or warning is printed
+    """
+    __slots__ = (
+        'value', 'type', 'native', 'template', 'evaluated',
+        'file', 'line', 'scope')
+
     def __init__(self, value, value_type=None, trace=None):
         if value_type == '':
             value_type = None
         self.value = value
         self.type = value_type
-        self.trace = trace
+        # set by type checks to the value converted to a native
+        # python type, used by compiler backends
+        self.native = None
+        self.template = compile_template(value)
+        # set once an eval closure evaluated the value
+        self.evaluated = False
+
+        if trace is None:
+            self.file = None
+        else:
+            self.file = trace_file(trace.path)
+            self.line = trace.line
+            self.scope = trace.scope
+
+    @property
+    def trace(self) -> Trace:
+        """returns a Trace object of where the value is defined"""
+        if self.file is None:
+            return None
+        return Trace(trace_paths[self.file], self.line, self.scope, '')
 
     def __repr__(self):
         return self.value
 
 
+def compile_template(value: str) -> list:
+    """compiles a value into a list of literal chunks and
+    (scope, key) reference slots, returns None if the value
+    does not contain any references
+    """
+    if Token.SCOPE_RESOLUTION_OPERATOR not in value:
+        return None
+
+    template = []
+    pos = 0
+
+    for match in Token.REFERENCE.finditer(value):
+        if match.start() > pos:
+            template.append(value[pos:match.start()])
+        # split reference in format `Scope::key` to (Scope, key)
+        template.append(tuple(match.group().split(
+            Token.SCOPE_RESOLUTION_OPERATOR, 1)))
+        pos = match.end()
+
+    if pos < len(value):
+        template.append(value[pos:])
+    return template
+
+
 class Scope:
     """
     Scopes are defined with the format:
@@ -191,6 +465,8 @@ class Scope:
     were parsed, their closures, closure symbols and whether they
     should not be compiled to the final output (internal)
     """
+    __slots__ = ('id', 'internal', 'lut', 'trace', 'closures', 'symbols')
+
     def __init__(
         self,
         id: str,
@@ -207,9 +483,19 @@ class Scope:
 
     def call_closures(self, global_lut: dict):
         """call closure defined in lut[scope]"""
+        profiler = context().profiler
+
         for closure in self.closures:
-            if closure is not None:
+            if closure is None:
+                continue
+            if profiler is None:
+                closure(global_lut, self)
+                continue
+            profiler.begin('closure')
+            try:
                 closure(global_lut, self)
+            finally:
+                profiler.end('closure', closure.__name__.strip('_'), self)
 
     def get_symbols(self, target_symbols: list):
         for symbol in target_symbols:
@@ -221,6 +507,213 @@ class Scope:
         return self.id + str(self.lut)
 
 
+class IncludeGraph:
+    """
+    Keeps track of the files included during a compilation.
+
+    Paths are canonicalized so each file is parsed at most once,
+    no matter how many scopes include it. Files that are being
+    parsed are kept in a stack to detect circular includes.
+
+    The include graph maps each file to the files it includes,
+    in the order they were included.
+
+    When the `jobs` env flag is greater than 1, the first stage of
+    parsing included files runs in a pool of worker processes, the
+    second stage still runs in include order so the output is the
+    same as parsing them one after another
+
+    Compilations that share a dict of `shared` look up tables reuse
+    the resolved look up tables of files included by a previous
+    compilation, as long as the files did not change, only the
+    files they include are included again, and the warnings reported
+    while resolving them are reported again.
+    Files that call `setenv` are always parsed, since the closure
+    changes the environment of the compilation
+
+    When only some scopes are compiled (see `select_scopes`), the
+    scope headers of included files are scanned first, and files
+    that do not define, or include a file that defines, one of the
+    requested scopes or a `setenv` scope are not parsed at all
+    """
+    def __init__(self, shared: dict = None):
+        self.graph = OrderedDict()
+        self.includes = {}
+        self.shared = shared
+        self.parsed = {}
+        self.paths = OrderedDict()
+        self.stack = []
+        self.pending = {}
+        self.prefetched = set()
+        self.pool = None
+        # scope headers of files scanned by `defines`
+        self.scanned = {}
+        # signatures of the scopes of each file before they are
+        # resolved, only recorded in watch mode
+        self.signatures = None
+
+    def enter(self, path: str) -> str:
+        """marks a file as being parsed, returns its canonical path"""
+        node = os.path.realpath(path)
+        self.paths.setdefault(node, path)
+        self.graph.setdefault(node, [])
+        self.stack.append(node)
+        return node
+
+    def leave(self):
+        """marks the last entered file as parsed"""
+        self.stack.pop()
+
+    def include(self, parent: str, path: str, trace: Trace) -> dict:
+        """parses a file included by parent, returns its look up table
+        or None if the file was already parsed during this compilation
+        """
+        node = os.path.realpath(path)
+        parent = os.path.realpath(parent)
+        self.graph.setdefault(parent, []).append(node)
+        self.includes.setdefault(parent, []).append((path, trace))
+
+        if node in self.stack:
+            # the file includes itself through the files in the stack
+            #    a.ini -> b.ini -> a.ini
+            cycle = self.stack[self.stack.index(node):] + [node]
+            fail(Err.INCLUDE_CYCLE, trace,
+                 ' -> '.join(self.paths.get(n, n) for n in cycle))
+
+        if node in self.parsed:
+            return None
+
+        self.enter(path)
+        profiler = context().profiler
+        if profiler is not None:
+            profiler.begin('file')
+        try:
+            version = file_version(path)
+            shared = self.shared.get(node) if self.shared is not None else None
+            if shared is not None and shared[0] == version:
+                # resolved by a previous compilation, and not changed since
+                version, lut, includes, warnings = shared
+                self.parsed[node] = lut
+                load_warnings(warnings, path)
+                self.replay(path, includes)
+                return lut
+
+            with context().record() as diagnostics:
+                if node in self.pending:
+                    # file was built by a worker process
+                    data, warnings = self.pending.pop(node).result()
+                    load_warnings(warnings, path)
+                    lut = load_lut(data, path)
+                else:
+                    lut = build_file(path)
+                if self.signatures is not None:
+                    self.signatures[node] = scope_signatures(lut)
+                # prefetch files included by this file before calling closures
+                self.prefetch(lut)
+                lut = resolve(lut)
+            # the warnings of the files this file includes
+            # are reported again when they are replayed
+            warnings = dump_warnings([d for d in diagnostics if d.trace
+                                      and d.trace.path == path])
+        finally:
+            self.leave()
+            if profiler is not None:
+                profiler.end('file', path)
+        self.parsed[node] = lut
+
+        if self.shared is not None and only_scopes() is None and not any(
+                CLOSURES['setenv'] in obj.closures for obj in lut.values()):
+            # look up tables resolved for some of their scopes are not shared
+            self.shared[node] = (
+                version, lut, self.includes.get(node, []), warnings)
+        return lut
+
+    def defines(self, path: str, scopes: set, visiting: set = None) -> bool:
+        """returns whether a file, or a file it includes, defines
+        one of `scopes` or calls setenv, only the scope headers
+        of the files are scanned
+        """
+        node = os.path.realpath(path)
+        if node not in self.scanned:
+            try:
+                with open(path, 'r') as f:
+                    self.scanned[node] = scan(lines(f), path)
+            except IOError:
+                # included anyway, to fail on the missing file
+                return True
+            # skipped files are still watched and cached
+            self.paths.setdefault(node, path)
+
+        visiting = visiting if visiting is not None else set()
+        if node in visiting:
+            # circular include, failed on when the file is included
+            return False
+        visiting.add(node)
+
+        lut = self.scanned[node]
+        if any(scope_id in scopes or CLOSURES['setenv'] in obj.closures
+               or implements(obj, scopes) for scope_id, obj in lut.items()):
+            return True
+        return any(self.defines(symbol, scopes, visiting)
+                   for obj in lut.values()
+                   if CLOSURES['include'] in obj.closures
+                   for symbol in obj.symbols)
+
+    def replay(self, path: str, includes: list):
+        """includes the files a shared file included when it was
+        resolved, in the same order as its include closures did
+        """
+        for symbol, trace in includes:
+            try:
+                parsed = self.include(path, symbol, trace)
+            except IOError as e:
+                fail(Err.NO_INPUT, trace, symbol)
+            if parsed is not None:
+                context().extern_parsed.append(parsed)
+
+    def prefetch(self, lut: dict):
+        """starts building the files included by scopes in a
+        look up table in worker processes
+        """
+        jobs = env_int('jobs', 1)
+
+        if jobs < 2 or id(lut) in self.prefetched:
+            return
+        only = only_scopes()
+        self.prefetched.add(id(lut))
+
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(jobs)
+
+        for obj in lut.values():
+            if CLOSURES['include'] not in obj.closures:
+                continue
+            for symbol in obj.symbols:
+                node = os.path.realpath(symbol)
+                if node in self.parsed or node in self.pending or (
+                        self.shared is not None and node in self.shared):
+                    continue
+                if only is not None and not self.defines(symbol, only):
+                    continue
+                self.pending[node] = self.pool.submit(
+                    build_snapshot, symbol, env_true('snapshots', True))
+
+    def shutdown(self):
+        """stops the worker processes"""
+        if self.pool is not None:
+            for future in self.pending.values():
+                future.cancel()
+            self.pool.shutdown()
+            self.pool = None
+        self.pending.clear()
+
+    def files(self) -> list:
+        """returns the path of every file in the graph,
+        starting with the root file
+        """
+        return list(self.paths.values())
+
+
 class Closure:
     """
     Closures are called after all scopes have been parsed into
@@ -251,14 +744,18 @@ class Closure:
         Evaluates python expression for all values in
         the caller's lut, and re-assigns the result
         """
+        profiler = context().profiler
+
         for key in caller.lut:
-            try:
-                caller.lut[key].value = str(eval(caller.lut[key].value))
-            except NameError:
-                # Undefined name, do not evaluate, leave as str literal
-                pass
-            except Exception as e:
-                fail(Err.EVAL_ERROR, caller.trace, e.args)
+            if not caller.lut[key].evaluated:
+                # values referenced by other keys are already
+                # evaluated while resolving references
+                if profiler is None:
+                    eval_value(caller.lut[key], caller.trace)
+                else:
+                    start = time.perf_counter()
+                    eval_value(caller.lut[key], caller.trace)
+                    profiler.key(caller, key, time.perf_counter() - start)
 
     def include(global_lut: dict, caller: Scope):
         """include closure
@@ -268,13 +765,26 @@ class Closure:
 
             [scope] :: include :file :path/file1
         """
+        compiler = context()
+        # start parsing every file included by the global lut
+        # in worker processes, when `jobs` is set
+        compiler.include_graph.prefetch(global_lut)
+        only = only_scopes()
+
         for symbol in caller.symbols:
+            if only is not None and not compiler.include_graph.defines(
+                    symbol, only):
+                # nothing requested is defined by the file
+                continue
             try:
-                with open(symbol, 'r') as f:
-                    # parse file
-                    extern_parsed.append(parse(f.read(), symbol))
+                # parse file, unless it was already
+                # parsed during this compilation
+                parsed = compiler.include_graph.include(
+                    caller.trace.path, symbol, caller.trace)
             except IOError as e:
                 fail(Err.NO_INPUT, caller.trace, symbol)
+            if parsed is not None:
+                compiler.extern_parsed.append(parsed)
 
     def setenv(global_lut: dict, caller: Scope):
         """setenv closure
@@ -286,8 +796,14 @@ class Closure:
         """
         caller.internal = True
 
+        compiler = context()
         for key in caller.lut:
-            env_flags[key] = caller.lut[key].value
+            compiler.env[key] = caller.lut[key].value
+
+        if compiler.profiler is None and (
+                env_true('profile') or env_true('memory')):
+            # profile the rest of the compilation
+            compiler.profiler = Profiler(env_true('memory'))
 
     def abstract(global_lut: dict, caller: Scope):
         """abstract closure
@@ -352,79 +868,440 @@ class Closure:
             Value(' '.join(list(caller.get_symbols(target.symbols))))
 
 
-class Type:
+class Compiler:
     """
-    Checks if a str object could be parsed into another type
+    Owns the state of a compilation: the compiler environment,
+    the include graph, the look up tables of included files and
+    the diagnostics reported while compiling.
+
+    Module level functions use the compiler entered in the
+    current thread or asyncio task, or the default compiler:
+
+        with Compiler({'format': 'bin'}) as compiler:
+            lut = compiler.parse('items.ini')
+
+        output = Compiler().compile('items.ini')
+
+    Errors are raised as CompileError, errors and warnings are
+    collected in `diagnostics` when `collect` is set, and printed
+    when `echo` is set.
+
+    Compilers in different threads are independent, they can
+    reuse the resolved look up tables of files included by each
+    other through a `shared` dict
     """
-    LEGAL_INT = '+-0123456789abcdefxo'
-    LEGAL_FLOAT = '+-.0123456789e'
-    LEGAL_BOOL = ['true', 'false']
+    def __init__(self, env: dict = None, shared: dict = None,
+                 echo: bool = False, collect: bool = True):
+        self.base_env = {'sorted': False}
+        self.base_env.update(env or {})
+        self.shared = shared
+        self.echo = echo
+        self.collect = collect
+        # lists the diagnostics are recorded in, see `record`
+        self.recordings = []
+        self.tokens = []
+        self.profiler = None
+        self.reset()
+
+    def reset(self):
+        """clears the state left by a compilation, and restores
+        the environment the compiler was created with
+        """
+        self.env = dict(self.base_env)
+        self.extern_parsed = []
+        self.include_graph = IncludeGraph(self.shared)
+        self.diagnostics = []
+        self.stop_profiler()
+        self.profiler = None
+        with self:
+            if env_true('profile') or env_true('memory'):
+                self.profiler = Profiler(env_true('memory'))
+
+    def report(self, level: str, report: tuple,
+               trace: Trace = None, extra: str = '') -> Diagnostic:
+        """collects an error or warning"""
+        diagnostic = Diagnostic(level, report, trace, extra)
+        if self.collect:
+            self.diagnostics.append(diagnostic)
+        for recording in self.recordings:
+            recording.append(diagnostic)
+        if self.echo:
+            print(repr(diagnostic))
+        return diagnostic
+
+    @contextlib.contextmanager
+    def record(self):
+        """records the diagnostics reported inside a with block
+        in a list, whether the compiler collects them or not
+
+            with compiler.record() as diagnostics:
+                lut = build(src, path)
+        """
+        recording = []
+        self.recordings.append(recording)
+        try:
+            yield recording
+        finally:
+            # empty recordings are equal, remove this one by identity
+            self.recordings = [r for r in self.recordings
+                               if r is not recording]
+
+    def __enter__(self):
+        self.tokens.append(active_compiler.set(self))
+        return self
+
+    def __exit__(self, *args):
+        active_compiler.reset(self.tokens.pop())
+
+    def parse(self, input_file: str, profiling: bool = False) -> dict:
+        """parses an input file and the files it includes,
+        returns the merged look up table
+
+        Memory tracing started by the profiler is stopped once the
+        file is parsed, unless `profiling` is set to go on profiling
+        the output, the caller then stops it with `profiler.stop`
+        """
+        self.reset()
+        try:
+            return self.parse_input(input_file)
+        finally:
+            if not profiling:
+                self.stop_profiler()
+
+    def parse_input(self, input_file: str) -> dict:
+        """parses an input file with the compiler entered"""
+        with self:
+            # a setenv closure may start profiling while the file is
+            # parsed, only the profiler that began timing it ends it
+            profiler = self.profiler
+            if profiler is not None:
+                profiler.begin('file')
+            try:
+                # read and parse source file
+                with open(input_file, 'r') as f:
+                    self.include_graph.enter(input_file)
+                    lut = parse_stream(f, input_file)
+                    self.include_graph.leave()
+            except IOError as e:
+                fail(Err.NO_INPUT, extra=e.args)
+            finally:
+                self.include_graph.shutdown()
+                if profiler is not None:
+                    profiler.end('file', input_file)
+
+            for parsed in self.extern_parsed:
+                # update look up table with files parsed externally
+                lut.update(parsed)
+            lut = select_output(lut)
+        return lut
+
+    def compile(self, input_file: str):
+        """parses and compiles an input file in the output format,
+        returns the output as a str, or bytes for binary formats
+        """
+        try:
+            lut = self.parse(input_file, profiling=True)
+            with self:
+                compiler, mode = output_format()
+                f = io.StringIO() if mode == 'w' else io.BytesIO()
+                compiler(lut, f)
+        finally:
+            self.stop_profiler()
+        return f.getvalue()
+
+    def stop_profiler(self):
+        """stops the memory tracing started by the profiler, the
+        profile recorded so far is kept
+        """
+        if self.profiler is not None:
+            self.profiler.stop()
 
-    def env() -> dict:
-        return dict((k.replace('_', ''), v) for
-                    (k, v) in Type.__dict__.items())
 
-    def _str(value: str) -> bool:
-        return True
+class Profiler:
+    """
+    Records the wall time and number of calls of each phase,
+    closure and included file of a compilation, and the time
+    spent on each scope and key.
 
-    def _bool(value: str) -> bool:
-        return value.lower() in Type.LEGAL_BOOL
+    Phases and closures are timed without the phases they call,
+    and files without the files they include, so an include
+    closure only counts the time spent outside included files:
 
-    def _int(value: str) -> bool:
-        return all(c in Type.LEGAL_INT for c in value.lower())
+        profiler.begin('phase')
+        ...
+        profiler.end('phase', 'build')
 
-    def _float(value: str) -> bool:
-        return all(c in Type.LEGAL_FLOAT for c in value.lower())
+    Every timed call is also kept as an event of a chrome trace.
 
-    def i8(value: str) -> bool:
-        return Type.__parse_int(value, 7)
+    When `memory` is set, memory allocations are traced with
+    tracemalloc to record the peak memory allocated during each
+    phase, closure and file, including the ones they call, and
+    the peak memory of the process once they return, tracing is
+    stopped by `stop` if the profiler started it
+    """
+    def __init__(self, memory: bool = False):
+        self.origin = time.perf_counter()
+        self.memory = memory
+        # whether allocations are traced by this profiler
+        self.tracing = memory and not tracemalloc.is_tracing()
+        if self.tracing:
+            tracemalloc.start()
+        # (category, name): [calls, seconds, peak bytes, peak rss bytes]
+        self.totals = OrderedDict()
+        # (path, scope id): seconds, and (path, scope id, key): seconds
+        self.scopes = {}
+        self.keys = {}
+        # (category, name, scope id, start, seconds)
+        self.events = []
+        # files and phases are nested separately
+        self.stacks = {'file': [], 'phase': []}
+
+    def begin(self, category: str):
+        """starts timing a call"""
+        stack = self.stacks['file' if category == 'file' else 'phase']
+        if self.memory:
+            # keep the peak of the calls in progress
+            # before tracing the peak of this call
+            peak = tracemalloc.get_traced_memory()[1]
+            for frames in self.stacks.values():
+                if frames:
+                    frames[-1][2] = max(frames[-1][2], peak)
+            tracemalloc.reset_peak()
+        stack.append([time.perf_counter(), 0.0, 0])
+
+    def end(self, category: str, name: str, obj: Scope = None):
+        """stops timing the last call started in category,
+        the time is also added to the scope obj
+        """
+        stack = self.stacks['file' if category == 'file' else 'phase']
+        start, nested, peak = stack.pop()
+        elapsed = time.perf_counter() - start
+        if stack:
+            stack[-1][1] += elapsed
+
+        total = self.totals.setdefault((category, name), [0, 0.0, 0, 0])
+        total[0] += 1
+        total[1] += elapsed - nested
+        if self.memory:
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+            total[2] = max(total[2], peak)
+            total[3] = peak_rss()
+
+        scope_id = None
+        if obj is not None:
+            scope_id = obj.id
+            node = (obj.trace.path if obj.trace else '', obj.id)
+            self.scopes[node] = self.scopes.get(node, 0.0) + elapsed - nested
+        self.events.append((category, name, scope_id, start, elapsed))
+
+    def stop(self):
+        """stops tracing memory allocations once the profile is
+        finished, unless they were traced before the profiler started
+        """
+        if self.tracing:
+            tracemalloc.stop()
+            self.tracing = False
+
+    def key(self, obj: Scope, key: str, elapsed: float):
+        """adds the time spent on a key of the scope obj"""
+        node = (obj.trace.path if obj.trace else '', obj.id, key)
+        self.keys[node] = self.keys.get(node, 0.0) + elapsed
+
+    def slowest(self, table: dict, top: int) -> list:
+        return sorted(table.items(), key=lambda item: -item[1])[:top]
+
+    def summary(self, top: int = PROFILE_TOP) -> str:
+        """returns a table of the recorded times"""
+        rows = ['{0}profile:{1}'.format(Term.OKBLUE, Term.ENDC)]
+        for (category, name), (calls, seconds, peak, rss) in sorted(
+                self.totals.items(), key=lambda item: -item[1][1]):
+            row = '  {0:<8} {1:<40} {2:>8} calls {3:>10.4f}s'.format(
+                category, name, calls, seconds)
+            if self.memory:
+                row += ' {0:>10.1f} MiB peak {1:>10.1f} MiB rss'.format(
+                    peak / 2 ** 20, rss / 2 ** 20)
+            rows.append(row)
+
+        rows.append('{0}slowest scopes:{1}'.format(Term.OKBLUE, Term.ENDC))
+        for (path, scope_id), seconds in self.slowest(self.scopes, top):
+            rows.append('  {0:>10.4f}s {1} [{2}]'.format(
+                seconds, path, scope_id))
+
+        rows.append('{0}slowest keys:{1}'.format(Term.OKBLUE, Term.ENDC))
+        for (path, scope_id, key), seconds in self.slowest(self.keys, top):
+            rows.append('  {0:>10.4f}s {1} [{2}] {3}'.format(
+                seconds, path, scope_id, key))
+        return '\n'.join(rows)
+
+    def to_json(self, top: int = PROFILE_TOP) -> dict:
+        """returns the recorded times as a json object, its `traceEvents`
+        can be opened by chrome://tracing or Perfetto
+        """
+        pid, tid = os.getpid(), threading.get_ident()
+        return {
+            'totals': [{'category': category, 'name': name,
+                        'calls': calls, 'seconds': seconds,
+                        'peak': peak if self.memory else None,
+                        'rss': rss if self.memory else None}
+                       for (category, name), (calls, seconds, peak, rss)
+                       in self.totals.items()],
+            'scopes': [{'path': path, 'scope': scope_id, 'seconds': seconds}
+                       for (path, scope_id), seconds
+                       in self.slowest(self.scopes, top)],
+            'keys': [{'path': path, 'scope': scope_id, 'key': key,
+                      'seconds': seconds}
+                     for (path, scope_id, key), seconds
+                     in self.slowest(self.keys, top)],
+            'traceEvents': [{
+                'name': name, 'cat': category, 'ph': 'X',
+                'ts': (start - self.origin) * 1e6, 'dur': seconds * 1e6,
+                'pid': pid, 'tid': tid,
+                'args': {'scope': scope_id} if scope_id is not None else {},
+            } for category, name, scope_id, start, seconds in self.events],
+        }
+
+
+def profiled(category: str):
+    """times each call of a function with the profiler of the
+    active compiler, when profiling is enabled
+    """
+    def decorator(function):
+        name = function.__name__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            profiler = context().profiler
+            if profiler is None:
+                return function(*args, **kwargs)
+            profiler.begin(category)
+            try:
+                return function(*args, **kwargs)
+            finally:
+                profiler.end(category, name)
+        return wrapper
+    return decorator
 
-    def u8(value: str) -> bool:
-        return Type.__parse_uint(value, 8)
 
-    def i16(value: str) -> bool:
-        return Type.__parse_int(value, 15)
+def context() -> Compiler:
+    """returns the compiler of the running compilation"""
+    compiler = active_compiler.get()
+    return default_compiler if compiler is None else compiler
 
-    def i32(value: str) -> bool:
-        return Type.__parse_int(value, 31)
 
-    def i64(value: str) -> bool:
-        return Type.__parse_int(value, 63)
+def is_positive(value) -> bool:
+    """returns True if a value is a positive integer, or its literal"""
+    return str(value).isdigit() and int(value) > 0
 
-    def f32(value: str) -> bool:
-        return Type._float(value)
 
-    def f64(value: str) -> bool:
-        return Type.f32(value)
+def env_int(key: str, default: int) -> int:
+    """returns env flag `key` as a positive integer"""
+    value = context().env.get(key, default)
+    if not is_positive(value):
+        fail(Err.OPTION_VALUE, extra='{0} = {1}'.format(key, value))
+    return int(value)
 
-    def __parse_int(value: str, size: int) -> bool:
-        if not Type._int(value):
-            return False
-        try:
-            # try parsing integer
-            if value.startswith(Token.HEX):
-                # parse hexadecimal
-                #    0x
-                value = int(value, 16)
-            elif value.startswith(Token.OCT):
-                # parse octal
-                #    0o
-                value = int(value, 8)
-            elif value.startswith(Token.BIN):
-                # parse binary
-                #    0b
-                value = int(value, 2)
-            else:
-                value = int(value)
-        except ValueError as e:
-            # cannot parse integer,
-            # thus value is not an integer
-            return False
-        # check if integer size fits in max size
-        return value.bit_length() <= size
 
-    def __parse_uint(value: str, size: int) -> bool:
-        return Type.__parse_int(value, size) and int(value) >= 0
+def env_true(key: str, default: bool = False) -> bool:
+    """returns True if env flag `key` is set to True"""
+    value = context().env.get(key, default)
+    return value is True or str(value).lower() == 'true'
+
+
+# used outside of any compilation, reports are printed but not
+# collected, since nothing resets the default compiler
+default_compiler = Compiler(echo=True, collect=False)
+
+
+class TypeCheck:
+    """
+    A type compiled into a regular expression that matches the
+    type's literals, a function that converts a matched literal
+    into a native python value, and the inclusive range the
+    native value must be in
+    """
+    __slots__ = ('pattern', 'convert', 'low', 'high')
+
+    def __init__(self, pattern, convert, low=None, high=None):
+        self.pattern = pattern
+        self.convert = convert
+        self.low = low
+        self.high = high
+
+    def native(self, value: str):
+        """returns the native value of a literal,
+        or None if the literal is not of this type
+        """
+        if self.pattern is not None and self.pattern.fullmatch(value) is None:
+            return None
+        native = self.convert(value)
+        if self.low is not None and not self.low <= native <= self.high:
+            return None
+        return native
+
+    def check_all(self, values: list) -> Value:
+        """checks a list of Value objects in one pass, and stores their
+        native value, returns the first value that is not of this type
+        """
+        match = self.pattern.fullmatch if self.pattern else None
+        convert, low, high = self.convert, self.low, self.high
+
+        for value_obj in values:
+            value = value_obj.value
+            if match is not None and match(value) is None:
+                return value_obj
+            native = convert(value)
+            if low is not None and not low <= native <= high:
+                return value_obj
+            value_obj.native = native
+        return None
+
+
+class Type:
+    """
+    Type checks used to ensure values are of a specific type,
+    integers may be written in decimal, hexadecimal (0x),
+    octal (0o) or binary (0b)
+    """
+    INT = re.compile('[+-]?(0[xX][0-9a-fA-F]+|0[oO][0-7]+|0[bB][01]+|[0-9]+)')
+    FLOAT = re.compile('[+-]?([0-9]+[.]?[0-9]*|[.][0-9]+)([eE][+-]?[0-9]+)?')
+    BOOL = re.compile('true|false', re.IGNORECASE)
+    F32_MAX = 3.4028234663852886e+38
+
+    def env() -> dict:
+        types = {
+            'str': TypeCheck(None, str),
+            'bool': TypeCheck(Type.BOOL, Type.to_bool),
+            'int': TypeCheck(Type.INT, Type.to_int),
+            'float': TypeCheck(Type.FLOAT, float),
+            'f32': TypeCheck(Type.FLOAT, float, -Type.F32_MAX, Type.F32_MAX),
+            'f64': TypeCheck(Type.FLOAT, float,
+                             -sys.float_info.max, sys.float_info.max),
+        }
+        for bits in (8, 16, 32, 64):
+            types['i%d' % bits] = TypeCheck(
+                Type.INT, Type.to_int, -2 ** (bits - 1), 2 ** (bits - 1) - 1)
+            types['u%d' % bits] = TypeCheck(
+                Type.INT, Type.to_int, 0, 2 ** bits - 1)
+        return types
+
+    def to_bool(value: str) -> bool:
+        return value.lower() == 'true'
+
+    def to_int(value: str) -> int:
+        digits = value.lstrip('+-').lower()
+        if digits.startswith(Token.HEX):
+            # parse hexadecimal
+            #    0x
+            return int(value, 16)
+        if digits.startswith(Token.OCT):
+            # parse octal
+            #    0o
+            return int(value, 8)
+        if digits.startswith(Token.BIN):
+            # parse binary
+            #    0b
+            return int(value, 2)
+        return int(value, 10)
 
 
 CLOSURES = Closure.env()
@@ -459,74 +1336,327 @@ def closure(global_lut: dict, src: str, trace: Trace):
 
 
 def scope(global_lut: dict, src: str, trace: Trace) -> str:
-    """parses a scope header, returns Scope object"""
+    """parses a scope header, returns the scope id"""
     # separate the scope header in key and closures
     src = src.split(Token.CLOSURE_OPERATOR)
     key = src[0].strip()
     # remove scope definition tokens
     key = key.replace(Token.OPEN_SCOPE_DEF, '').replace(Token.CLOSE_SCOPE_DEF, '')
+    return define_scope(global_lut, key, src[1:], trace)
 
-    if any(c in Token.ILLEGAL_NAME_CHARS for c in key):
+
+def define_scope(global_lut: dict, key: str, src: list, trace: Trace) -> str:
+    """defines the scope of a header in the look up table, src is the
+    list of closure definitions after each CLOSURE_OPERATOR of the
+    header, returns the scope id
+    """
+    if Token.ILLEGAL_NAME.search(key) is not None:
         # key contains illegal characters that would
         # cause unpredictable behaviour during parsing
         fail(Err.ILLEGAL_CHAR_SCOPE, trace, key)
 
     # update the trace to use the new scope
+    key = sys.intern(key)
     trace.scope = key
     # create a new Scope object with an empty look up table
     global_lut[key] = Scope(key, lut=OrderedDict(), strace=trace)
 
-    if len(src) > 2:
+    if len(src) > 1:
         # syntax error, having multiple CLOSURE_OPERATORS
         #    [scope] :: closure :: closure
-        fail(Err.UNDEFINED, trace, src[1:])
+        fail(Err.UNDEFINED, trace, src)
 
-    if len(src) > 1:
+    if len(src) > 0:
         # this scope header defines closures
-        for closure_def in src[1].split(Token.CLOSURE_DELIMITER):
+        for closure_def in src[0].split(Token.CLOSURE_DELIMITER):
             # parse each closure
             closure(global_lut, closure_def, trace)
     return trace.scope
 
 
-def pair(global_lut: dict, src: str, trace: Trace) -> str:
-    """parsers a key value pair, returns the key"""
-    kv = src.split(Token.VALUE_SEPARATOR)
+class Fold:
+    """
+    Constant folding of python expressions that only apply
+    arithmetic operators to literals, such as
+
+        2**(8 - 1) - 1
+
+    these expressions are computed by walking their syntax tree,
+    without compiling or evaluating any code
+    """
+    BINARY = {
+        ast.Add: operator.add,
+        ast.Sub: operator.sub,
+        ast.Mult: operator.mul,
+        ast.Div: operator.truediv,
+        ast.FloorDiv: operator.floordiv,
+        ast.Mod: operator.mod,
+        ast.Pow: operator.pow,
+        ast.LShift: operator.lshift,
+        ast.RShift: operator.rshift,
+        ast.BitOr: operator.or_,
+        ast.BitXor: operator.xor,
+        ast.BitAnd: operator.and_,
+    }
+    UNARY = {
+        ast.UAdd: operator.pos,
+        ast.USub: operator.neg,
+        ast.Invert: operator.invert,
+        ast.Not: operator.not_,
+    }
+
+    class Unfoldable(Exception):
+        pass
+
+    def fold(node: ast.AST):
+        """returns the value of an arithmetic expression node,
+        raises Unfoldable for any other kind of node
+        """
+        if isinstance(node, ast.Constant):
+            return node.value
+        if isinstance(node, ast.BinOp) and type(node.op) in Fold.BINARY:
+            return Fold.BINARY[type(node.op)](
+                Fold.fold(node.left), Fold.fold(node.right))
+        if isinstance(node, ast.UnaryOp) and type(node.op) in Fold.UNARY:
+            return Fold.UNARY[type(node.op)](Fold.fold(node.operand))
+        raise Fold.Unfoldable()
+
+
+@functools.lru_cache(maxsize=EVAL_CACHE_SIZE)
+def compile_expression(src: str) -> tuple:
+    """compiles a python expression, returns (result, None) if the
+    expression could be folded into a constant, or (None, code)
+
+    Results are cached by the expression's source, so expressions
+    repeated across scopes are only parsed and compiled once
+    """
+    tree = ast.parse(src.strip(), mode='eval')
+    try:
+        return str(Fold.fold(tree.body)), None
+    except Fold.Unfoldable:
+        return None, compile(tree, '<eval>', 'eval')
+
+
+def eval_value(value_obj: Value, trace: Trace):
+    """evaluates the python expression in a value, and re-assigns the result
+
+    Expressions that are not constant are evaluated with
+    only the builtins in `EVAL_BUILTINS` available
+    """
+    try:
+        result, code = compile_expression(value_obj.value)
+        if code is not None:
+            result = str(eval(code, {'__builtins__': EVAL_BUILTINS}))
+        value_obj.value = result
+
+        if value_obj.type in TYPES:
+            # the value was type checked before evaluation,
+            # update its native value from the result
+            value_obj.native = TYPES[value_obj.type].native(result)
+            if value_obj.native is None:
+                fail(Err.TYPE_ERROR, value_obj.trace, value_obj.type)
+    except NameError:
+        # Undefined name, do not evaluate, leave as str literal
+        pass
+    except Exception as e:
+        fail(Err.EVAL_ERROR, trace, e.args)
+    value_obj.evaluated = True
+
+
+def check_type(value_obj: Value):
+    """checks if a value matches its type, if it has one"""
+    if value_obj.type is not None:
+        check_values(value_obj.type, [value_obj])
+
+
+def check_values(value_type: str, values: list):
+    """checks that a list of values match a type, and stores their
+    native value to be used by compiler backends
+    """
+    if value_type not in TYPES:
+        # undefined type
+        fail(Err.UNDEFINED, values[0].trace, value_type)
 
-    if len(kv) > 2:
-        # warn about assigning a value twice
-        #    key = x = y
-        # in this case only the last value will be used
-        warn(Warn.MULTIPLE_ASSIGNMENT, trace)
+    invalid = TYPES[value_type].check_all(values)
+    if invalid is not None:
+        fail(Err.TYPE_ERROR, invalid.trace, value_type)
 
-    if len(kv) < 2:
-        # key with null value (allowed)
-        #    key =
-        # the value will be equal to an empty string
-        # a standard ini parser might recognize this as
-        # a key with a null value
-        kv.append('')
 
-    key, value = kv[0].strip(), kv[-1].strip()
-    value_type = ''
+def check_types(obj: Scope):
+    """checks that the values in a scope match their types, values
+    of the same type are checked together in one batch
+    """
+    batches = {}
 
-    if Token.SYMBOL_DEFINITION in key:
-        kt = key.split(Token.SYMBOL_DEFINITION)
-        key = kt[0].strip()
+    for value_obj in obj.lut.values():
+        # evaluated values were checked before evaluation
+        if value_obj.type is not None and not value_obj.evaluated:
+            batches.setdefault(value_obj.type, []).append(value_obj)
 
-        if len(kt) == 2:
-            value_type = kt[1].strip()
+    for value_type, values in batches.items():
+        check_values(value_type, values)
 
-    if any(c in Token.ILLEGAL_NAME_CHARS for c in key):
-        # key contains illegal characters that would
-        # cause unpredictable behaviour during parsing
-        fail(Err.ILLEGAL_CHAR_KEY, trace, key)
 
-    global_lut[trace.scope].lut[key] = Value(value, value_type, trace.copy())
-    return key
+def inlines(global_lut: dict, scope_id: str, key: str) -> bool:
+    """returns whether the key `scope_id::key` is created when the scope
+
+        [key] :: inline :scope_id
+
+    calls its closure, the caller must classify every symbol of
+    scope_id, otherwise the reference is left unresolved
+    """
+    caller = global_lut[key]
+    return (CLOSURES['inline'] in caller.closures
+            and caller.symbols[:1] == [scope_id]
+            and all(s in caller.lut for s in global_lut[scope_id].symbols))
+
+
+def references(global_lut: dict, template: list) -> list:
+    """returns the (scope, key) slots of a value's template that can
+    be looked up in the global lut, or in the target of an inline
+    closure (see `resolve_references`)
+    """
+    refs = []
+
+    for chunk in template:
+        if type(chunk) is tuple and chunk[0] in global_lut:
+            if chunk[1] in global_lut[chunk[0]].lut or (
+                    chunk[1] in global_lut
+                    and inlines(global_lut, chunk[0], chunk[1])):
+                refs.append(chunk)
+    return refs
+
+
+@profiled('phase')
+def resolve_references(global_lut: dict, scopes: set = None):
+    """resolves the references of every value in the global lut,
+    or only of the values in `scopes`, values in other scopes are
+    then considered already resolved
+
+    References form a dependency graph, values are resolved in
+    topological order so a referenced value is always resolved
+    before the values that reference it, no matter where the
+    scopes are declared. Each value is resolved exactly once.
+
+    Referenced values in `eval` scopes are evaluated before they
+    are substituted, and keys created by an `inline` closure
+    can be referenced before the closure is called
+
+        [Weapons] :: abstract :damage
+        [Harpy] :: inline :Weapons
+        damage = 475
+        [Stats]
+        harpy = Weapons::Harpy
+
+    Circular references fail with error code `E12`
+    """
+    eval_closure = CLOSURES['eval']
+    profiler = context().profiler
+    # values of keys created by inline closures
+    inlined = {}
+    done = set()
+
+    def dependencies(node: tuple) -> list:
+        scope_id, key = node
+        obj = global_lut[scope_id]
+
+        if key in obj.lut:
+            template = obj.lut[key].template
+            if template is None or (scopes is not None
+                                    and scope_id not in scopes):
+                return []
+            return references(global_lut, template)
+
+        # the key is created when the scope
+        #    [key] :: inline :scope_id
+        # calls its closure, `references` only returns inline targets
+        return [(key, s) for s in obj.symbols]
+
+    def settle(node: tuple):
+        # evaluate a referenced value from an eval scope
+        # before it is substituted
+        scope_id, key = node
+        obj = global_lut[scope_id]
+        if key not in obj.lut or eval_closure not in obj.closures:
+            return
+        value_obj = obj.lut[key]
+        if not value_obj.evaluated:
+            check_type(value_obj)
+            eval_value(value_obj, obj.trace)
+
+    def finalize(node: tuple, deps: list):
+        for dep in deps:
+            settle(dep)
+
+        scope_id, key = node
+        obj = global_lut[scope_id]
+
+        if key not in obj.lut:
+            caller = global_lut[key]
+            inlined[node] = ' '.join(caller.get_symbols(obj.symbols))
+        elif obj.lut[key].template is not None and (
+                scopes is None or scope_id in scopes):
+            # values whose references cannot be looked up are
+            # replaced as well, to warn about each reference
+            value_obj = obj.lut[key]
+            value_obj.value = replace_reference(
+                global_lut, value_obj.template, value_obj.trace, inlined)
 
+    for scope_id in global_lut:
+        if scopes is not None and scope_id not in scopes:
+            continue
+        for key, value_obj in global_lut[scope_id].lut.items():
+            node = (scope_id, key)
+            if node in done or value_obj.template is None:
+                # values without references are skipped outright
+                continue
 
-def replace_reference(global_lut: dict, value: str, trace: Trace) -> str:
+            # depth first search, the stack is kept explicitly
+            # so deep reference chains do not hit the recursion limit
+            stack = [(node, dependencies(node))]
+            visiting = {node: 0}
+
+            while stack:
+                node, deps = stack[-1]
+                i = visiting[node]
+
+                while i < len(deps) and deps[i] in done:
+                    i += 1
+                visiting[node] = i + 1
+
+                if i < len(deps):
+                    dep = deps[i]
+                    if dep in visiting:
+                        # dep is already in the stack
+                        cycle = [n for n, d in stack]
+                        cycle = cycle[cycle.index(dep):] + [dep]
+                        fail(Err.REFERENCE_CYCLE,
+                             global_lut[cycle[0][0]].lut[cycle[0][1]].trace,
+                             ' -> '.join(Token.SCOPE_RESOLUTION_OPERATOR.join(n)
+                                         for n in cycle))
+                    visiting[dep] = 0
+                    stack.append((dep, dependencies(dep)))
+                    continue
+
+                # every dependency is resolved
+                stack.pop()
+                del visiting[node]
+                if profiler is None:
+                    finalize(node, deps)
+                else:
+                    start = time.perf_counter()
+                    finalize(node, deps)
+                    profiler.key(global_lut[node[0]], node[1],
+                                 time.perf_counter() - start)
+                done.add(node)
+
+
+def replace_reference(
+    global_lut: dict,
+    template: list,
+    trace: Trace,
+    inlined: dict = {}
+) -> str:
     """replaces constant references in values to other keys
 
     [constants] :: internal
@@ -538,126 +1668,359 @@ def replace_reference(global_lut: dict, value: str, trace: Trace) -> str:
     compiles to:
     [test]
     key = 3.14159
+
+    the value must be compiled into a template (see `compile_template`),
+    only the reference slots of the template are looked up
     """
-    res = ''
+    res = []
 
-    # split value by Token.SPACE in case the reference
-    # is interpolated in the key's value
-    for arg in value.split(Token.SPACE):
-        # split reference in format `Scope::key` to (Scope, key)
-        src = arg.split(Token.SCOPE_RESOLUTION_OPERATOR)
+    for chunk in template:
+        if type(chunk) is str:
+            # literal text, spaces are kept as is
+            res.append(chunk)
+            continue
 
-        if len(src) < 2:
-            # src does not contain a `Token.SCOPE_RESOLUTION_OPERATOR`
-            # re-add the space and continue searching
-            res += arg + Token.SPACE
+        if chunk in inlined:
+            # the key is created by an inline closure
+            res.append(inlined[chunk])
             continue
 
-        if src[0] not in global_lut:
-            # src contains a `Token.SCOPE_RESOLUTION_OPERATOR` but
+        scope_id, key = chunk
+
+        if scope_id not in global_lut:
+            # chunk contains a `Token.SCOPE_RESOLUTION_OPERATOR` but
             # the scope referenced does not exist in the look up table
-            res += arg + Token.SPACE
+            res.append(scope_id + Token.SCOPE_RESOLUTION_OPERATOR + key)
             # log a warning, but do not fail with an error since this
             # could just be a string literal which contains the operator
-            warn(Warn.UNDEFINED_SCOPE_REFERENCE, trace, src[0])
+            warn(Warn.UNDEFINED_SCOPE_REFERENCE, trace, scope_id)
             continue
 
-        if src[1] not in global_lut[src[0]].lut:
-            # src contains a `Token.SCOPE_RESOLUTION_OPERATOR` and
+        if key not in global_lut[scope_id].lut:
+            # chunk contains a `Token.SCOPE_RESOLUTION_OPERATOR` and
             # the scope referenced exists in the look up table but
             # the key referenced does not exist in the scope's look up table
-            res += arg + Token.SPACE
-            warn(Warn.UNDEFINED_KEY_REFERENCE, trace, src[1])
+            res.append(scope_id + Token.SCOPE_RESOLUTION_OPERATOR + key)
+            warn(Warn.UNDEFINED_KEY_REFERENCE, trace, key)
             continue
 
-        scope_id, key = src
-
-        # src is a valid reference, look up the scope in the global
+        # chunk is a valid reference, look up the scope in the global
         # look up table, and the key in the scope's look up table
-        # replacing the src with the key's value
-        res += global_lut[scope_id].lut[key].value + Token.SPACE
-    return res.strip()
+        # replacing the chunk with the key's value
+        res.append(global_lut[scope_id].lut[key].value)
+    return ''.join(res)
 
 
 def parse(src: str, path: str) -> dict:
     """parsers super ini source, and returns a look up table"""
+    return parse_lines(src.split(Token.NEW_LINE), path)
+
+
+def parse_stream(fileobj, path: str) -> dict:
+    """parses super ini source from a file object, and returns a look up table
+
+    The file is read line by line, so only the look up table is kept
+    in memory and not the whole source text
+    """
+    return parse_lines(lines(fileobj), path)
+
+
+def lines(fileobj):
+    """yields the lines of a file object without line endings"""
+    for ln in fileobj:
+        yield ln.rstrip(Token.NEW_LINE)
+
+
+def parse_lines(src, path: str) -> dict:
+    """parses an iterable of super ini source lines, and returns a look up table"""
+    return resolve(build(src, path))
+
+
+def lex(src, path: str):
+    """splits an iterable of source lines into tokens, each token is a
+    (kind, scope, key, type, value, line) tuple, of one of the kinds:
+
+        Lex.SCOPE    a scope header, the value is the list of closure
+                     definitions after each CLOSURE_OPERATOR
+        Lex.PAIR     a key, value pair, continuation lines are
+                     collected and joined to the value once it ends
+        Lex.SYMBOLS  symbols placed on a separate line, the value
+                     is the list of symbols
+
+    scope is the id of the scope a token is in, or the scope defined
+    by a Lex.SCOPE token. Each line is classified once (see `Lex`),
+    and split with as few intermediate strings as possible
+    """
+    scope_id = '__global__'
+    # the item continuation lines are appended to, its value
+    # chunks are only joined once the item ends
+    item = None
+    chunks = None
+    # whether the current scope classified a key yet
+    classified = False
+
+    for i, ln in enumerate(src):
+        if Token.COMMENT in ln:
+            # strip comments
+            ln = ln[:ln.index(Token.COMMENT)]
+
+        stripped = ln.lstrip()
+        if not stripped:
+            # skip empty lines
+            continue
+        first = stripped[0]
+
+        if first != Token.OPEN_SCOPE_DEF and Token.VALUE_SEPARATOR not in ln:
+            if first == Token.SYMBOL_DEFINITION and not classified:
+                # this is a symbol placed on a separate line
+                #    [scope] :: closure
+                #    :symbol :symbol
+                if item is not None:
+                    yield item if chunks is None else item[:4] + (
+                        Token.SPACE.join(chunks), item[5])
+                    item = chunks = None
+                yield (Lex.SYMBOLS, scope_id, None, None, [
+                    symbol.strip() for symbol in
+                    stripped.split(Token.SYMBOL_DEFINITION)
+                    if symbol.strip() != ''], i + 1)
+                continue
+
+            if ln[0] in (Token.INDENT, Token.SPACE) and item is not None:
+                # this line is a continuation of a key's value
+                #    key =
+                #      value
+                if chunks is None:
+                    chunks = [item[4]]
+                chunks.append(stripped.rstrip())
+                continue
+
+            # this line does not define symbols, it is not continuation
+            # of an item, neither does it contain a key, value pair
+            fail(Err.UNDEFINED, Trace(path, i + 1, scope_id, ''), ln)
+
+        if item is not None:
+            yield item if chunks is None else item[:4] + (
+                Token.SPACE.join(chunks), item[5])
+            item = chunks = None
+
+        if first == Token.OPEN_SCOPE_DEF:
+            # separate the scope header in key and closures, and
+            # remove scope definition tokens from the key
+            header = stripped.split(Token.CLOSURE_OPERATOR)
+            scope_id = header[0].strip().replace(
+                Token.OPEN_SCOPE_DEF, '').replace(Token.CLOSE_SCOPE_DEF, '')
+            classified = False
+            yield (Lex.SCOPE, scope_id, None, None, header[1:], i + 1)
+            continue
+
+        key, _, value = ln.partition(Token.VALUE_SEPARATOR)
+        if Token.VALUE_SEPARATOR in value:
+            # warn about assigning a value twice
+            #    key = x = y
+            # in this case only the last value will be used
+            warn(Warn.MULTIPLE_ASSIGNMENT, Trace(path, i + 1, scope_id, ''))
+            value = value.rpartition(Token.VALUE_SEPARATOR)[2]
+
+        value_type = ''
+        if Token.SYMBOL_DEFINITION in key:
+            key, _, value_type = key.partition(Token.SYMBOL_DEFINITION)
+            # keys with more than one type are untyped
+            #    key: str: i32 = value
+            value_type = ('' if Token.SYMBOL_DEFINITION in value_type
+                          else value_type.strip())
+
+        key = key.strip()
+        if Token.ILLEGAL_NAME.search(key) is not None:
+            # key contains illegal characters that would
+            # cause unpredictable behaviour during parsing
+            fail(Err.ILLEGAL_CHAR_KEY, Trace(path, i + 1, scope_id, ''), key)
+
+        classified = True
+        # repeated key and type names share one str object
+        item = (Lex.PAIR, scope_id, sys.intern(key), sys.intern(value_type),
+                value.strip(), i + 1)
+
+    if item is not None:
+        yield item if chunks is None else item[:4] + (
+            Token.SPACE.join(chunks), item[5])
+
+
+@profiled('phase')
+def build(src, path: str) -> dict:
+    """first stage of parsing, builds the look up table from
+    an iterable of source lines without resolving references
+    or calling closures
+    """
     # setup a look up table with a global scope already defined,
     # the global scope is used to store keys that are placed outside
     # a scope in the source
     lut = OrderedDict()
-    lut['__global__'] = Scope('__global__')
+    lut['__global__'] = Scope('__global__', lut=OrderedDict())
     # create a trace object for the global scope
     trace = Trace(path, 0, '__global__', '')
 
-    # split the source to parse it line by line
-    src = src.split(Token.NEW_LINE)
+    for kind, scope_id, key, value_type, value, line in lex(src, path):
+        # set the current line number in the trace object
+        trace.line = line
+
+        if kind == Lex.PAIR:
+            # the value only copies the trace's fields
+            lut[scope_id].lut[key] = Value(value, value_type, trace)
+        elif kind == Lex.SCOPE:
+            # copy trace object so each scope remembers where
+            # they are defined in the source
+            trace.scope = define_scope(lut, scope_id, value, trace.copy())
+        else:
+            lut[scope_id].symbols.extend(value)
+    return lut
+
+
+@profiled('phase')
+def scan(src, path: str) -> dict:
+    """reduced first stage of parsing, builds a look up table of
+    the scope headers and symbols in an iterable of source lines,
+    the scopes do not hold their keys
+    """
+    lut = OrderedDict()
+    lut['__global__'] = Scope('__global__', lut=OrderedDict())
+    trace = Trace(path, 0, '__global__', '')
+    # whether the current scope classified a key yet
+    classified = False
 
-    for i in range(len(src)):
-        # strip comments
-        ln = src[i].split(Token.COMMENT)[0]
+    for i, ln in enumerate(src):
+        ln = ln.split(Token.COMMENT)[0].strip()
 
         if ln == '':
-            # skip empty lines
             continue
 
-        # set the current line number in the trace object
         trace.line = i + 1
 
-        if ln.lstrip()[0] == Token.OPEN_SCOPE_DEF:
-            # copy trace object so each scope remembers where
-            # they are defined in the source
+        if ln[0] == Token.OPEN_SCOPE_DEF:
             trace.scope = scope(lut, ln, trace.copy())
+            classified = False
+        elif Token.VALUE_SEPARATOR in ln:
+            classified = True
+        elif ln[0] == Token.SYMBOL_DEFINITION and not classified:
+            # symbols placed on separate lines, see `build`
+            lut[trace.scope].symbols.extend(
+                symbol.strip() for symbol in ln.split(Token.SYMBOL_DEFINITION)
+                if symbol.strip() != '')
+    return lut
+
+
+def only_scopes() -> set:
+    """returns the scope ids set by the `only` env flag, or None
+    when every scope is compiled
+    """
+    only = context().env.get('only')
+    if not only:
+        return None
+    return set(scope_id.strip() for scope_id in
+               str(only).split(Token.CLOSURE_DELIMITER) if scope_id.strip())
+
+
+def implements(obj: Scope, scopes: set) -> bool:
+    """returns whether a scope adds to the output of one of `scopes`,
+    by inlining into it, or in the columnar format, where abstract
+    scopes are written with a row for each implementing scope, by
+    implementing it with `as`
+    """
+    if not obj.symbols or obj.symbols[0] not in scopes:
+        return False
+    return CLOSURES['inline'] in obj.closures or (
+        CLOSURES['as'] in obj.closures
+        and output_format()[0] is compile_columns)
+
+
+def select_scopes(lut: dict, only: set) -> set:
+    """returns the ids of the scopes in a look up table built by the
+    first stage of parsing that have to be resolved to compile the
+    scopes in `only`:
+
+        the requested scopes, and the scopes that call setenv or
+        include a file that defines one of them (see `IncludeGraph`)
+        [T] :: abstract :x  ; the scopes that inline into a selected
+        [S] :: inline :T    ; scope are selected as well
+        y = R::z            ; as are the scopes a selected scope references
+
+    In the columnar format, the scopes that implement a selected scope
+    with `as` are selected as well (see `implements`). Abstract scopes
+    are only read for their symbols, which are known after the first
+    stage, they are selected when requested
+    """
+    include_graph = context().include_graph
+    # scopes that add to the output of each target
+    inlined = {}
+    stack = []
+
+    for obj in lut.values():
+        if obj.symbols and implements(obj, obj.symbols[:1]):
+            inlined.setdefault(obj.symbols[0], []).append(obj.id)
+        if obj.id in only or CLOSURES['setenv'] in obj.closures or (
+                CLOSURES['include'] in obj.closures and any(
+                    include_graph.defines(symbol, only)
+                    for symbol in obj.symbols)):
+            stack.append(obj.id)
+
+    selected = set()
+    while stack:
+        scope_id = stack.pop()
+        if scope_id in selected or scope_id not in lut:
             continue
+        selected.add(scope_id)
+        stack.extend(inlined.get(scope_id, ()))
+        for value_obj in lut[scope_id].lut.values():
+            for chunk in value_obj.template or ():
+                if type(chunk) is tuple:
+                    stack.append(chunk[0])
+    return selected
+
+
+def select_output(lut: dict) -> dict:
+    """returns the scopes of a merged look up table set by the `only`
+    env flag, or the whole look up table when every scope is compiled,
+    the scopes that add to the output of a requested scope are kept
+    as well (see `implements`)
+    """
+    only = only_scopes()
+    if only is None:
+        return lut
 
-        if Token.VALUE_SEPARATOR not in ln:
-            if ln.strip()[0] == Token.SYMBOL_DEFINITION and not lut[trace.scope].lut:
-                # this is a symbol placed on a separate line
-                #    [scope] :: closure
-                #    :symbol
-                for symbol in ln.strip().split(Token.SYMBOL_DEFINITION):
-                    # loop through each symbol defined in this line
-                    # this handles the case:
-                    #    [scope] :: closure
-                    #    :symbol
-                    #    :symbol :symbol
-                    # it also strips the SYMBOL_DEFINITION token
-                    if (symbol.strip() != ''):
-                        # append the symbol to the scopes symbols list
-                        lut[trace.scope].symbols.append(symbol.strip())
-                continue
+    for scope_id in sorted(only - set(lut)):
+        warn(Warn.UNDEFINED_SCOPE, extra=scope_id)
+    return OrderedDict((scope_id, obj) for scope_id, obj in lut.items()
+                       if scope_id in only or implements(obj, only))
 
-            if ln[0] == Token.INDENT or ln[0] == Token.SPACE:
-                # this line is a continuation of a key's value
-                #    key =
-                #      value
-                # note tha an indent is required to signify that the
-                # line is indeed a continuation of the previous
-                # append a SPACE token and the line to the current scope[key]
-                lut[trace.scope].lut[trace.key].value += Token.SPACE + ln.strip()
-                continue
-            # this line does not define symbols, it is not continuation
-            # of the previous line, neither does it contain a key, value pair
-            fail(Err.UNDEFINED, trace, ln)
 
-        # this line must be a key, value classification
-        trace.key = pair(lut, ln, trace)
+def resolve(lut: dict, scopes: set = None) -> dict:
+    """second stage of parsing, resolves references, checks types
+    and calls the closures of each scope in the look up table
+
+    When `scopes` is given, only those scopes are resolved, the
+    other scopes must already have been resolved. When the `only`
+    env flag is set, scopes that are not selected are not resolved
+    (see `select_scopes`)
+    """
+    only = only_scopes()
+    if only is not None:
+        selected = select_scopes(lut, only)
+        scopes = selected if scopes is None else scopes & selected
+
+    # resolve references to keys in other look up tables
+    resolve_references(lut, scopes)
+
+    profiler = context().profiler
 
     for scope_id in lut:
-        for key in lut[scope_id].lut:
-            obj = lut[scope_id]
-            value_obj = obj.lut[key]
-            if Token.SCOPE_RESOLUTION_OPERATOR in value_obj.value:
-                # this key's value contains one or more
-                # references to keys in other look up tables
-                value_obj.value = replace_reference(
-                    lut, value_obj.value, value_obj.trace)
-            if value_obj.type is not None:
-                # key has a type, check if the key's value matches this type
-                if value_obj.type not in TYPES:
-                    # undefined type
-                    fail(Err.UNDEFINED, trace, value_obj.type)
-                if not TYPES[value_obj.type](value_obj.value):
-                    fail(Err.TYPE_ERROR, value_obj.trace, value_obj.type)
+        if scopes is not None and scope_id not in scopes:
+            continue
+        # check if the scope's values match their types
+        if profiler is None:
+            check_types(lut[scope_id])
+        else:
+            profiler.begin('phase')
+            check_types(lut[scope_id])
+            profiler.end('phase', 'check_types', lut[scope_id])
         # the global look up table has been parsed
         # now call closures defined in each scope object
         # to finish building the look up table
@@ -665,16 +2028,180 @@ def parse(src: str, path: str) -> dict:
     return lut
 
 
+def dump_lut(lut: dict) -> tuple:
+    """returns a look up table built by the first stage of parsing
+    as nested tuples that can be serialized with marshal
+    """
+    closure_ids = dict((v, k) for k, v in CLOSURES.items() if callable(v))
+    scopes = []
+
+    for obj in lut.values():
+        scopes.append((
+            obj.id,
+            # the global scope does not have a trace
+            obj.trace.line if obj.trace else 0,
+            tuple(closure_ids[c] for c in obj.closures),
+            tuple(obj.symbols),
+            tuple((key, v.value, v.type, v.line)
+                  for key, v in obj.lut.items())))
+    return tuple(scopes)
+
+
+def load_lut(data: tuple, path: str) -> dict:
+    """rebuilds a look up table from the output of `dump_lut`"""
+    lut = OrderedDict()
+
+    for scope_id, line, closures, symbols, values in data:
+        strace = Trace(path, line, scope_id, '') if line else None
+        obj = Scope(scope_id, lut=OrderedDict(), strace=strace)
+        obj.closures = [CLOSURES[c] for c in closures]
+        obj.symbols = list(symbols)
+        # values only copy the fields of the trace
+        trace = Trace(path, 0, scope_id, '')
+
+        for key, value, value_type, vline in values:
+            trace.line = vline
+            obj.lut[key] = Value(value, value_type, trace)
+        lut[scope_id] = obj
+    return lut
+
+
+def snapshot_path(path: str) -> str:
+    """returns the path of the look up table snapshot of a source file"""
+    head, tail = os.path.split(path)
+    return os.path.join(head, SNAPSHOT_DIR, tail + '.lut')
+
+
+def replace_file(path: str, data: bytes):
+    """atomically replaces the content of a file, the data is written
+    to a temporary file unique to the writer first so that concurrent
+    writers of the same file never interleave
+    """
+    fd, tmp = tempfile.mkstemp(prefix=os.path.basename(path) + '.',
+                               suffix='.tmp', dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def dump_warnings(diagnostics: list) -> tuple:
+    """returns the warnings of a list of diagnostics reported while
+    building a file as tuples that can be serialized with marshal
+    """
+    return tuple((d.code, d.message, d.trace.line if d.trace else 0,
+                  d.trace.scope if d.trace else '', d.extra)
+                 for d in diagnostics if d.level == 'warning')
+
+
+def load_warnings(warnings: tuple, path: str):
+    """reports the output of `dump_warnings` again"""
+    for code, message, line, scope_id, extra in warnings:
+        warn((code, message),
+             Trace(path, line, scope_id, '') if line else None, extra)
+
+
+def load_snapshot(path: str, st: os.stat_result) -> dict:
+    """returns the snapshot of a source file, or None if there is no
+    snapshot or the source file changed since it was written, the
+    warnings reported while building the file are reported again
+    """
+    try:
+        with open(snapshot_path(path), 'rb') as f:
+            magic, mtime, size, data, warnings = marshal.loads(f.read())
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+
+    if (magic, mtime, size) != (SNAPSHOT_MAGIC, st.st_mtime_ns, st.st_size):
+        return None
+    load_warnings(warnings, path)
+    return load_lut(data, path)
+
+
+def write_snapshot(path: str, st: os.stat_result, lut: dict,
+                   warnings: tuple = ()):
+    """writes the snapshot of a source file, the source file's
+    modification time and size are stored to detect changes, along
+    with the output of `dump_warnings` for the warnings of its build
+    """
+    snapshot = snapshot_path(path)
+    data = marshal.dumps((SNAPSHOT_MAGIC, st.st_mtime_ns, st.st_size,
+                          dump_lut(lut), warnings))
+    try:
+        os.makedirs(os.path.dirname(snapshot), exist_ok=True)
+        replace_file(snapshot, data)
+    except OSError:
+        # just like .pyc files, snapshots are only an optimization
+        pass
+
+
+@profiled('phase')
+def build_file(path: str) -> dict:
+    """first stage of parsing for a source file, the look up table
+    is loaded from the file's snapshot when it is up to date
+    """
+    if not env_true('snapshots', True):
+        with open(path, 'r') as f:
+            return build(lines(f), path)
+
+    # stat before reading so changes made while
+    # parsing invalidate the snapshot
+    st = os.stat(path)
+    lut = load_snapshot(path, st)
+
+    if lut is None:
+        with context().record() as diagnostics:
+            with open(path, 'r') as f:
+                lut = build(lines(f), path)
+        write_snapshot(path, st, lut, dump_warnings(diagnostics))
+    return lut
+
+
+def build_snapshot(path: str, snapshots: bool) -> tuple:
+    """builds a source file in a worker process, returns the output
+    of `dump_lut` and `dump_warnings` to send them back to the
+    compiler, which reports the warnings
+    """
+    with Compiler({'snapshots': snapshots}) as compiler:
+        lut = build_file(path)
+    return dump_lut(lut), dump_warnings(compiler.diagnostics)
+
+
+def scope_signatures(lut: dict) -> dict:
+    """returns the signature of each scope in a look up table built by
+    the first stage of parsing, scopes with the same signature compile
+    to the same output no matter which line they are defined on
+    """
+    closure_ids = dict((v, k) for k, v in CLOSURES.items() if callable(v))
+    return dict((obj.id, (
+        tuple(closure_ids[c] for c in obj.closures),
+        tuple(obj.symbols),
+        tuple((key, v.value, v.type) for key, v in obj.lut.items())))
+        for obj in lut.values())
+
+
 def sorted_keys(lut: dict) -> list:
-    """returns sorted lut keys if env_flags[sorted] is set to True"""
-    if env_flags['sorted'] is True or str(env_flags['sorted']).lower() == 'true':
+    """returns sorted lut keys if env flag `sorted` is set to True"""
+    if env_true('sorted'):
         return sorted(lut.keys(), key=lambda x: x)
     return lut.keys()
 
 
-def compile_text(lut: dict) -> str:
-    """compiles a look up table to standard ini"""
-    out = ''
+@profiled('phase')
+def compile_to(lut: dict, fileobj, buffer_size: int = COMPILE_BUFFER_SIZE):
+    """compiles a look up table to standard ini, writing to a file object
+
+    Lines are collected in a buffer that is written out in chunks once
+    it grows past `buffer_size` lines, so the compiled output is never
+    held in memory as a whole
+    """
+    buf = []
 
     for scope in sorted_keys(lut):
         # get scope object
@@ -686,10 +2213,10 @@ def compile_text(lut: dict) -> str:
 
         # compile scope object in the format:
         # [Scope.id]
-        out += Token.OPEN_SCOPE_DEF \
-            + obj.id \
-            + Token.CLOSE_SCOPE_DEF \
-            + Token.NEW_LINE
+        buf.append(Token.OPEN_SCOPE_DEF
+                   + obj.id
+                   + Token.CLOSE_SCOPE_DEF
+                   + Token.NEW_LINE)
 
         # compile scope object's look up table
         for key in sorted_keys(obj.lut):
@@ -697,18 +2224,970 @@ def compile_text(lut: dict) -> str:
 
             # copile key value pair in the format:
             # key=value
-            out += key \
-                + Token.VALUE_SEPARATOR \
-                + value \
-                + Token.NEW_LINE
-    return out
+            buf.append(key
+                       + Token.VALUE_SEPARATOR
+                       + value
+                       + Token.NEW_LINE)
 
+            # flushed between keys, so a large scope
+            # is not held in memory as a whole either
+            if len(buf) >= buffer_size:
+                fileobj.write(''.join(buf))
+                buf.clear()
+    fileobj.write(''.join(buf))
 
-def get_stats(lut: dict) -> dict:
-    stats = {'objects': 0, 'iobjects': 0, 'keys': 0, 'ikeys': 0}
 
-    for sc in lut:
-        stats['objects'] += 1
+def compile_text(lut: dict) -> str:
+    """compiles a look up table to standard ini"""
+    out = io.StringIO()
+    compile_to(lut, out)
+    return out.getvalue()
+
+
+class Binary:
+    """
+    Layout of the binary output format, all integers are little endian
+    and every section starts at an offset aligned to 8 bytes
+
+        header        HEADER
+        scope index   u32[scope_slots]
+        scope table   SCOPE[scope_count]
+        for each scope:
+            key index     u32[key_slots]
+            key table     KEY[key_count]
+        string pool   utf-8 strings, referenced by (offset, length)
+
+    Indexes are open addressing hash tables with linear probing,
+    a slot holds the position of an entry in its table plus one,
+    or 0 if the slot is empty. The hash of a name is the crc32 of
+    its utf-8 bytes, and the first slot probed is hash & (slots - 1)
+
+    KEY entries hold the value as text, and the native value of
+    typed keys as an 8 byte payload, tagged with one of the TAG_*
+    """
+    MAGIC = b'SINB'
+    VERSION = 1
+
+    # magic, version, reserved, scope_count, scope_slots,
+    # scope index offset, scope table offset, pool offset, pool size
+    HEADER = struct.Struct('<4sHHIIIIII')
+    # name offset, name length, key_count, key_slots,
+    # key index offset, key table offset
+    SCOPE = struct.Struct('<IIIIII')
+    # key offset, key length, value offset, value length, tag, payload
+    KEY = struct.Struct('<IIIIB7x8s')
+
+    TAG_STR = 0
+    TAG_INT = 1
+    TAG_UINT = 2
+    TAG_FLOAT = 3
+    TAG_BOOL = 4
+
+    PAYLOADS = {
+        TAG_STR: struct.Struct('<8x'),
+        TAG_INT: struct.Struct('<q'),
+        TAG_UINT: struct.Struct('<Q'),
+        TAG_FLOAT: struct.Struct('<d'),
+        TAG_BOOL: struct.Struct('<Q'),
+    }
+
+    def align(offset: int) -> int:
+        return (offset + 7) & ~7
+
+    def slots(count: int) -> int:
+        """returns the size of a hash index for count entries"""
+        slots = 1
+        while slots < count * 2:
+            slots <<= 1
+        return slots
+
+    def index(hashes: list) -> bytes:
+        """builds a hash index from the hashes of a table's entries"""
+        slots = Binary.slots(len(hashes))
+        mask = slots - 1
+        table = [0] * slots
+
+        for i, h in enumerate(hashes):
+            slot = h & mask
+            while table[slot]:
+                slot = (slot + 1) & mask
+            table[slot] = i + 1
+        return struct.pack('<%dI' % slots, *table)
+
+    def find(buf, index: int, slots: int, table: int,
+             entry: struct.Struct, pool: int, name: str) -> int:
+        """returns the offset of the entry named `name` in a table,
+        or -1, the first two fields of an entry must be the
+        (offset, length) of its name in the string pool
+        """
+        data = name.encode()
+        mask = slots - 1
+        slot = zlib.crc32(data) & mask
+
+        while True:
+            i = struct.unpack_from('<I', buf, index + 4 * slot)[0]
+            if i == 0:
+                return -1
+            offset = table + entry.size * (i - 1)
+            name_offset, name_len = entry.unpack_from(buf, offset)[:2]
+            if buf[pool + name_offset:pool + name_offset + name_len] == data:
+                return offset
+            slot = (slot + 1) & mask
+
+    def tag(value_obj: Value) -> tuple:
+        """returns the (tag, payload) of a value's native value"""
+        native = value_obj.native
+
+        if isinstance(native, bool):
+            return Binary.TAG_BOOL, int(native)
+        if isinstance(native, float):
+            return Binary.TAG_FLOAT, native
+        if isinstance(native, int):
+            if value_obj.type.startswith('u') and native < 2 ** 64:
+                return Binary.TAG_UINT, native
+            if -2 ** 63 <= native < 2 ** 63:
+                return Binary.TAG_INT, native
+        # strings, untyped values and integers
+        # that do not fit in 64 bits
+        return Binary.TAG_STR, None
+
+
+@profiled('phase')
+def compile_binary(lut: dict, fileobj):
+    """compiles a look up table to the binary format described in
+    `Binary`, values are written as text and as native values, so
+    a runtime can look up scope/key pairs without parsing
+    """
+    pool = {}
+    pool_size = 0
+
+    def pool_ref(src: str) -> tuple:
+        # strings are stored once in the pool
+        nonlocal pool_size
+        if src not in pool:
+            data = src.encode()
+            pool[src] = (pool_size, len(data), data)
+            pool_size += len(data)
+        return pool[src][:2]
+
+    scopes = []
+
+    for scope in sorted_keys(lut):
+        obj = lut[scope]
+        if obj.internal:
+            # do not compile interal scopes
+            continue
+
+        keys = []
+        for key in sorted_keys(obj.lut):
+            value_obj = obj.lut[key]
+            tag, payload = Binary.tag(value_obj)
+            keys.append((key, pool_ref(key), pool_ref(value_obj.value),
+                         tag, Binary.PAYLOADS[tag].pack(
+                             *(() if payload is None else (payload,)))))
+        scopes.append((obj.id, pool_ref(obj.id), keys))
+
+    # compute the offset of every section
+    scope_slots = Binary.slots(len(scopes))
+    scope_index = Binary.align(Binary.HEADER.size)
+    scope_table = Binary.align(scope_index + 4 * scope_slots)
+    offset = Binary.align(scope_table + Binary.SCOPE.size * len(scopes))
+    offsets = []
+
+    for scope_id, name, keys in scopes:
+        key_index = offset
+        key_table = Binary.align(key_index + 4 * Binary.slots(len(keys)))
+        offsets.append((key_index, key_table))
+        offset = Binary.align(key_table + Binary.KEY.size * len(keys))
+
+    def pad(position: int):
+        fileobj.write(bytes(Binary.align(position) - position))
+
+    fileobj.write(Binary.HEADER.pack(
+        Binary.MAGIC, Binary.VERSION, 0, len(scopes), scope_slots,
+        scope_index, scope_table, offset, pool_size))
+    pad(Binary.HEADER.size)
+
+    index = Binary.index([zlib.crc32(s[0].encode()) for s in scopes])
+    fileobj.write(index)
+    pad(scope_index + len(index))
+
+    for (scope_id, name, keys), (key_index, key_table) in zip(scopes, offsets):
+        fileobj.write(Binary.SCOPE.pack(
+            name[0], name[1], len(keys), Binary.slots(len(keys)),
+            key_index, key_table))
+    pad(scope_table + Binary.SCOPE.size * len(scopes))
+
+    for (scope_id, name, keys), (key_index, key_table) in zip(scopes, offsets):
+        index = Binary.index([zlib.crc32(k[0].encode()) for k in keys])
+        fileobj.write(index)
+        pad(key_index + len(index))
+
+        fileobj.write(b''.join(
+            Binary.KEY.pack(k[0], k[1], v[0], v[1], tag, payload)
+            for key, k, v, tag, payload in keys))
+        pad(key_table + Binary.KEY.size * len(keys))
+
+    for offset, length, data in pool.values():
+        fileobj.write(data)
+
+
+class Columns:
+    """
+    Layout of the columnar output format, all integers are little
+    endian and every section starts at an offset aligned to 8 bytes
+
+        header        HEADER
+        table index   u32[table_slots]
+        table table   TABLE[table_count]
+        for each table:
+            row index     u32[row_slots]
+            row table     ROW[row_count]
+            column table  COLUMN[column_count]
+            for each column:
+                data      CODE[row_count], or for text columns
+                          u32[row_count + 1] offsets into the utf-8
+                          values that follow them
+        string pool   utf-8 names, referenced by (offset, length)
+
+    Each abstract scope is compiled to a table, with a row for every
+    scope that implements it with `as` or `inline`, and a column for
+    each of its symbols. Columns whose values all have the same numeric
+    or bool type are packed with the struct code of that type, other
+    columns hold their values as text. Indexes are built the same
+    way as in the binary format (see `Binary`)
+    """
+    MAGIC = b'SINC'
+    VERSION = 1
+
+    # magic, version, reserved, table_count, table_slots,
+    # table index offset, table table offset, pool offset, pool size
+    HEADER = struct.Struct('<4sHHIIIIII')
+    # name offset, name length, row_count, row_slots, row index offset,
+    # row table offset, column_count, column table offset
+    TABLE = struct.Struct('<IIIIIIII')
+    # name offset, name length
+    ROW = struct.Struct('<II')
+    # name offset, name length, code, data offset, data size
+    COLUMN = struct.Struct('<IIB3xII')
+
+    # struct codes of the types columns are packed with
+    CODES = {
+        'bool': '?',
+        'int': 'q',
+        'float': 'd',
+        'f32': 'f',
+        'f64': 'd',
+        'i8': 'b',
+        'u8': 'B',
+        'i16': 'h',
+        'u16': 'H',
+        'i32': 'i',
+        'u32': 'I',
+        'i64': 'q',
+        'u64': 'Q',
+    }
+    TEXT = 's'
+
+    def pack(values: list) -> tuple:
+        """returns the (code, data) of a column of Value objects"""
+        types = set(value_obj.type for value_obj in values)
+
+        if len(types) == 1:
+            code = Columns.CODES.get(types.pop())
+            natives = [value_obj.native for value_obj in values]
+            if code is not None and None not in natives:
+                try:
+                    return ord(code), struct.pack(
+                        '<%d%s' % (len(natives), code), *natives)
+                except struct.error:
+                    # `int` values that do not fit in 64 bits
+                    pass
+
+        data = [value_obj.value.encode() for value_obj in values]
+        offsets = [0]
+        for src in data:
+            offsets.append(offsets[-1] + len(src))
+        return ord(Columns.TEXT), struct.pack(
+            '<%dI' % len(offsets), *offsets) + b''.join(data)
+
+
+def columns_tables(lut: dict) -> OrderedDict:
+    """returns the tables written by the columnar format, every abstract
+    scope in a look up table, internal or not, mapped to the scopes
+    that implement it with `as` or `inline` (its rows)
+    """
+    implements = (CLOSURES['as'], CLOSURES['inline'])
+    tables = OrderedDict(
+        (scope_id, []) for scope_id in sorted_keys(lut)
+        if CLOSURES['abstract'] in lut[scope_id].closures)
+
+    for scope_id in sorted_keys(lut):
+        obj = lut[scope_id]
+        if obj.symbols and obj.symbols[0] in tables and any(
+                closure in obj.closures for closure in implements):
+            tables[obj.symbols[0]].append(obj)
+    return tables
+
+
+@profiled('phase')
+def compile_columns(lut: dict, fileobj):
+    """compiles the abstract scopes of a look up table to the columnar
+    format described in `Columns`, so a runtime can read every value
+    of a symbol at once instead of splitting inlined values
+
+    Internal abstract scopes are compiled as well, other scopes are not
+    """
+    pool = {}
+    pool_size = 0
+
+    def pool_ref(src: str) -> tuple:
+        # strings are stored once in the pool
+        nonlocal pool_size
+        if src not in pool:
+            data = src.encode()
+            pool[src] = (pool_size, len(data), data)
+            pool_size += len(data)
+        return pool[src][:2]
+
+    tables = columns_tables(lut)
+
+    # compute the offset of every section, and the
+    # sections of each table that are written after them
+    table_slots = Binary.slots(len(tables))
+    table_index = Binary.align(Columns.HEADER.size)
+    table_table = Binary.align(table_index + 4 * table_slots)
+    offset = Binary.align(table_table + Columns.TABLE.size * len(tables))
+    entries = []
+    sections = []
+
+    for scope_id, rows in tables.items():
+        symbols = lut[scope_id].symbols
+        row_index = offset
+        index = Binary.index([zlib.crc32(obj.id.encode()) for obj in rows])
+        row_table = Binary.align(row_index + len(index))
+        row_entries = b''.join(
+            Columns.ROW.pack(*pool_ref(obj.id)) for obj in rows)
+        column_table = Binary.align(row_table + len(row_entries))
+        offset = Binary.align(
+            column_table + Columns.COLUMN.size * len(symbols))
+        columns = []
+        data_sections = []
+
+        for symbol in symbols:
+            code, data = Columns.pack([obj.lut[symbol] for obj in rows])
+            columns.append(Columns.COLUMN.pack(
+                *pool_ref(symbol), code, offset, len(data)))
+            data_sections.append((offset, data))
+            offset = Binary.align(offset + len(data))
+
+        sections += [(row_index, index), (row_table, row_entries),
+                     (column_table, b''.join(columns))] + data_sections
+
+        entries.append(Columns.TABLE.pack(
+            *pool_ref(scope_id), len(rows), Binary.slots(len(rows)),
+            row_index, row_table, len(symbols), column_table))
+
+    fileobj.write(Columns.HEADER.pack(
+        Columns.MAGIC, Columns.VERSION, 0, len(tables), table_slots,
+        table_index, table_table, offset, pool_size))
+    position = Columns.HEADER.size
+    sections = [(table_index, Binary.index(
+        [zlib.crc32(scope_id.encode()) for scope_id in tables])),
+        (table_table, b''.join(entries))] + sections
+
+    for start, data in sections:
+        fileobj.write(bytes(start - position))
+        fileobj.write(data)
+        position = start + len(data)
+
+    fileobj.write(bytes(offset - position))
+    for pool_offset, length, data in pool.values():
+        fileobj.write(data)
+
+
+def native_value(value_obj: Value):
+    """returns the native value of a typed value, or its text"""
+    if value_obj.native is None:
+        return value_obj.value
+    return value_obj.native
+
+
+def python_literal(value) -> str:
+    """returns the source of a native value in a python module, the
+    repr of non finite floats (inf, nan) is not a python literal
+    """
+    if isinstance(value, float) and not math.isfinite(value):
+        return 'float(' + repr(repr(value)) + ')'
+    return repr(value)
+
+
+@profiled('phase')
+def compile_python(lut: dict, fileobj, buffer_size: int = COMPILE_BUFFER_SIZE):
+    """compiles a look up table to a python module, that defines the
+    compiled scopes as a dict of dicts of keys to native values
+
+        scopes = {
+            'Weapons': {
+                'Melltith': '355 26',
+            },
+        }
+
+    once imported, the module is loaded from its cached .pyc
+    """
+    buf = ['# compiled by super_ini.py, do not edit\n', 'scopes = {\n']
+
+    for scope in sorted_keys(lut):
+        obj = lut[scope]
+        if obj.internal:
+            # do not compile interal scopes
+            continue
+
+        buf.append('    ' + repr(obj.id) + ': {\n')
+        for key in sorted_keys(obj.lut):
+            buf.append('        ' + repr(key) + ': '
+                       + python_literal(native_value(obj.lut[key])) + ',\n')
+
+            # flushed between keys, like `compile_to`
+            if len(buf) >= buffer_size:
+                fileobj.write(''.join(buf))
+                buf.clear()
+        buf.append('    },\n')
+    buf.append('}\n')
+    fileobj.write(''.join(buf))
+
+
+@profiled('phase')
+def compile_marshal(lut: dict, fileobj):
+    """compiles a look up table to the same dicts as `compile_python`,
+    serialized with marshal after the MARSHAL_MAGIC number
+    """
+    scopes = {}
+
+    for scope in sorted_keys(lut):
+        obj = lut[scope]
+        if obj.internal:
+            # do not compile interal scopes
+            continue
+        scopes[obj.id] = dict((key, native_value(obj.lut[key]))
+                              for key in sorted_keys(obj.lut))
+
+    fileobj.write(MARSHAL_MAGIC)
+    fileobj.write(marshal.dumps(scopes))
+
+
+# output formats, and the mode their output file is opened with
+FORMATS = {
+    'ini': (compile_to, 'w'),
+    'bin': (compile_binary, 'wb'),
+    'cols': (compile_columns, 'wb'),
+    'py': (compile_python, 'w'),
+    'marshal': (compile_marshal, 'wb'),
+}
+
+
+def output_format() -> tuple:
+    """returns the (compiler, file mode) of the `format` env flag"""
+    name = str(context().env.get('format', 'ini'))
+    if name not in FORMATS:
+        fail(Err.UNDEFINED_FORMAT, extra=name)
+    return FORMATS[name]
+
+
+def compile_file(lut: dict, path: str):
+    """compiles a look up table to a file in the output format"""
+    compiler, mode = output_format()
+    with open(path, mode) as f:
+        compiler(lut, f)
+
+
+def fingerprint_path(path: str) -> str:
+    """returns the path of the scope fingerprints of a compiled file"""
+    head, tail = os.path.split(path)
+    return os.path.join(head, SNAPSHOT_DIR, tail + '.fp')
+
+
+def scope_fingerprints(lut: dict) -> tuple:
+    """returns the (scope id, digest) of every scope compiled from a
+    look up table, in output order. The digest covers the keys and
+    values of the scope, and their types in formats other than ini,
+    since the native values written depend on them
+
+    The columnar format writes the tables of `columns_tables` instead,
+    internal scopes included, the digest of a table covers its symbols
+    and the typed values of each row
+    """
+    compiler = output_format()[0]
+    fingerprints = []
+
+    if compiler is compile_columns:
+        for scope_id, rows in columns_tables(lut).items():
+            symbols = lut[scope_id].symbols
+            src = Token.SYMBOL_DEFINITION.join(symbols) + ''.join([
+                Token.NEW_LINE + Token.OPEN_SCOPE_DEF + obj.id
+                + Token.CLOSE_SCOPE_DEF + ''.join([
+                    Token.NEW_LINE + symbol + Token.VALUE_SEPARATOR
+                    + obj.lut[symbol].value + Token.SYMBOL_DEFINITION
+                    + str(obj.lut[symbol].type) for symbol in symbols])
+                for obj in rows])
+            fingerprints.append((scope_id, hashlib.blake2b(
+                src.encode(), digest_size=16).digest()))
+        return tuple(fingerprints)
+
+    typed = compiler is not compile_to
+
+    for scope_id in sorted_keys(lut):
+        obj = lut[scope_id]
+        if obj.internal:
+            continue
+        values = obj.lut
+        if typed:
+            src = ''.join([key + Token.VALUE_SEPARATOR + values[key].value
+                           + Token.SYMBOL_DEFINITION + str(values[key].type)
+                           + Token.NEW_LINE for key in sorted_keys(values)])
+        else:
+            src = ''.join([key + Token.VALUE_SEPARATOR + values[key].value
+                           + Token.NEW_LINE for key in sorted_keys(values)])
+        fingerprints.append((scope_id, hashlib.blake2b(
+            src.encode(), digest_size=16).digest()))
+    return tuple(fingerprints)
+
+
+def load_fingerprints(path: str) -> tuple:
+    """returns the scope fingerprints recorded when a file was last
+    compiled, or None if the file was changed since, or was compiled
+    to another output format
+    """
+    try:
+        with open(fingerprint_path(path), 'rb') as f:
+            magic, name, version, fingerprints = marshal.loads(f.read())
+        current = file_version(path)
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+
+    if (magic, name, version) != (
+            FINGERPRINT_MAGIC, str(context().env.get('format', 'ini')),
+            current):
+        return None
+    return fingerprints
+
+
+def write_fingerprints(path: str, fingerprints: tuple):
+    """records the scope fingerprints of a compiled file, the file's
+    modification time and size are stored to detect changes
+    """
+    target = fingerprint_path(path)
+    data = marshal.dumps((
+        FINGERPRINT_MAGIC, str(context().env.get('format', 'ini')),
+        file_version(path), fingerprints))
+    try:
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        replace_file(target, data)
+    except OSError:
+        # the output is written again next time
+        pass
+
+
+def write_delta(lut: dict, fingerprints: tuple, previous: tuple, path: str):
+    """compiles the scopes whose fingerprint changed to a delta file,
+    scopes that are no longer compiled are written without keys
+    """
+    current = dict(fingerprints)
+    previous = OrderedDict(previous or ())
+    delta = OrderedDict()
+    # the columnar format compiles a table from its rows
+    tables = (columns_tables(lut)
+              if output_format()[0] is compile_columns else None)
+
+    for scope_id, digest in fingerprints:
+        if previous.get(scope_id) != digest:
+            delta[scope_id] = lut[scope_id]
+            if tables is not None:
+                for obj in tables[scope_id]:
+                    delta[obj.id] = obj
+    for scope_id in previous:
+        if scope_id not in current:
+            delta[scope_id] = Scope(scope_id, lut=OrderedDict())
+            if tables is not None:
+                # written as a table without rows or columns
+                delta[scope_id].closures.append(CLOSURES['abstract'])
+
+    try:
+        compile_file(delta, path)
+    except IOError as e:
+        fail(Err.NO_OUTPUT, extra=e.args)
+
+
+def update_file(lut: dict, path: str) -> bool:
+    """compiles a look up table to a file in the output format, unless
+    every scope compiles to the same output as the last time the file
+    was compiled, returns whether the file was written
+
+    The `delta` env flag sets a file the scopes that changed since the
+    last time are compiled to (see `write_delta`), fingerprints are not
+    recorded when the `fingerprints` env flag is False
+    """
+    env = context().env
+    if not env_true('fingerprints', True) and 'delta' not in env:
+        compile_file(lut, path)
+        return True
+
+    fingerprints = scope_fingerprints(lut)
+    previous = load_fingerprints(path)
+
+    if 'delta' in env:
+        write_delta(lut, fingerprints, previous, env['delta'])
+    if fingerprints == previous:
+        # leave the file untouched, so its modification time
+        # does not change either
+        return False
+
+    compile_file(lut, path)
+    write_fingerprints(path, fingerprints)
+    return True
+
+
+class CompiledIni(Mapping):
+    """
+    Read only mapping of scope ids to the keys of a compiled ini file
+
+    The file is memory mapped and only the offsets of the scopes are
+    indexed when it is opened, the keys of a scope are decoded the
+    first time the scope is accessed
+    """
+    def __init__(self, fileobj):
+        self.file = fileobj
+        self.buf = map_file(fileobj)
+        self.index = {}
+        self.scopes = {}
+
+        buf = self.buf
+        size = len(buf)
+        start = 0 if buf[:1] == b'[' else buf.find(b'\n[')
+
+        while start != -1:
+            if buf[start:start + 1] == b'\n':
+                start += 1
+            # scope header
+            #    [scope]
+            eol = buf.find(b'\n', start)
+            eol = size if eol == -1 else eol
+            header = buf[start:eol].strip()
+            # the scope's keys end at the next scope header
+            start = buf.find(b'\n[', eol)
+            self.index[header[1:-1].decode()] = (
+                eol + 1, size if start == -1 else start + 1)
+
+    def __getitem__(self, scope_id: str) -> dict:
+        if scope_id not in self.scopes:
+            start, end = self.index[scope_id]
+            lut = {}
+            for ln in self.buf[start:end].decode().split(Token.NEW_LINE):
+                ln = ln.strip()
+                if ln == '' or ln[0] == Token.COMMENT:
+                    continue
+                key, _, value = ln.partition(Token.VALUE_SEPARATOR)
+                lut[key.strip()] = value.strip()
+            self.scopes[scope_id] = lut
+        return self.scopes[scope_id]
+
+    def __iter__(self):
+        return iter(self.index)
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def close(self):
+        close_map(self.buf)
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class CompiledBinary(Mapping):
+    """
+    Read only mapping of scope ids to the keys of a file compiled to
+    the binary format (see `Binary`)
+
+    The file is memory mapped, scopes and keys are looked up through
+    the hash indexes stored in the file, nothing is decoded until
+    a scope or key is accessed
+    """
+    def __init__(self, fileobj):
+        self.file = fileobj
+        self.buf = map_file(fileobj)
+        (magic, version, _, self.count, self.slots, self.index,
+         self.table, self.pool, _) = Binary.HEADER.unpack_from(self.buf)
+
+        if magic != Binary.MAGIC or version != Binary.VERSION:
+            raise ValueError('not a super ini binary file')
+        self.scopes = {}
+
+    def string(self, offset: int, length: int) -> str:
+        return self.buf[self.pool + offset:self.pool + offset + length].decode()
+
+    def __getitem__(self, scope_id: str) -> Mapping:
+        if scope_id not in self.scopes:
+            offset = Binary.find(
+                self.buf, self.index, self.slots, self.table,
+                Binary.SCOPE, self.pool, scope_id)
+            if offset == -1:
+                raise KeyError(scope_id)
+            self.scopes[scope_id] = BinaryScope(
+                self, *Binary.SCOPE.unpack_from(self.buf, offset)[2:])
+        return self.scopes[scope_id]
+
+    def __iter__(self):
+        for i in range(self.count):
+            offset = self.table + Binary.SCOPE.size * i
+            yield self.string(*Binary.SCOPE.unpack_from(self.buf, offset)[:2])
+
+    def __len__(self) -> int:
+        return self.count
+
+    def close(self):
+        self.scopes.clear()
+        close_map(self.buf)
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class BinaryScope(Mapping):
+    """
+    Read only mapping of the keys of a scope in a binary file,
+    typed keys are returned as their native value, other keys
+    are returned as str
+    """
+    def __init__(self, compiled: CompiledBinary,
+                 count: int, slots: int, index: int, table: int):
+        self.compiled = compiled
+        self.count = count
+        self.slots = slots
+        self.index = index
+        self.table = table
+
+    def decode(self, offset: int):
+        (key_offset, key_len, value_offset, value_len,
+         tag, payload) = Binary.KEY.unpack_from(self.compiled.buf, offset)
+        if tag == Binary.TAG_STR:
+            return self.compiled.string(value_offset, value_len)
+        native = Binary.PAYLOADS[tag].unpack(payload)[0]
+        return bool(native) if tag == Binary.TAG_BOOL else native
+
+    def __getitem__(self, key: str):
+        offset = Binary.find(
+            self.compiled.buf, self.index, self.slots, self.table,
+            Binary.KEY, self.compiled.pool, key)
+        if offset == -1:
+            raise KeyError(key)
+        return self.decode(offset)
+
+    def __iter__(self):
+        for i in range(self.count):
+            offset = self.table + Binary.KEY.size * i
+            yield self.compiled.string(
+                *Binary.KEY.unpack_from(self.compiled.buf, offset)[:2])
+
+    def __len__(self) -> int:
+        return self.count
+
+
+class CompiledColumns(Mapping):
+    """
+    Read only mapping of abstract scope ids to the tables of a file
+    compiled to the columnar format (see `Columns`)
+
+    The file is memory mapped, tables are looked up through the hash
+    index stored in the file, and columns are only read when accessed
+    """
+    def __init__(self, fileobj):
+        self.file = fileobj
+        self.buf = map_file(fileobj)
+        (magic, version, _, self.count, self.slots, self.index,
+         self.table, self.pool, _) = Columns.HEADER.unpack_from(self.buf)
+
+        if magic != Columns.MAGIC or version != Columns.VERSION:
+            raise ValueError('not a super ini columns file')
+
+    def string(self, offset: int, length: int) -> str:
+        return self.buf[self.pool + offset:self.pool + offset + length].decode()
+
+    def __getitem__(self, scope_id: str) -> Mapping:
+        offset = Binary.find(
+            self.buf, self.index, self.slots, self.table,
+            Columns.TABLE, self.pool, scope_id)
+        if offset == -1:
+            raise KeyError(scope_id)
+        return ColumnTable(self, *Columns.TABLE.unpack_from(self.buf, offset)[2:])
+
+    def __iter__(self):
+        for i in range(self.count):
+            offset = self.table + Columns.TABLE.size * i
+            yield self.string(*Columns.TABLE.unpack_from(self.buf, offset)[:2])
+
+    def __len__(self) -> int:
+        return self.count
+
+    def close(self):
+        close_map(self.buf)
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class ColumnTable(Mapping):
+    """
+    Read only mapping of the symbols of an abstract scope to the column
+    of values of every scope that implements it, in row order
+
+    Packed columns are read with a single copy into an `array.array`
+    (bool columns as unsigned bytes), text columns are returned as a
+    list of str. `rows` lists the implementing scopes, and `row`
+    returns the position of a scope in the columns
+    """
+    def __init__(self, compiled: CompiledColumns, count: int, slots: int,
+                 index: int, table: int, columns: int, column_table: int):
+        self.compiled = compiled
+        self.count = count
+        self.slots = slots
+        self.index = index
+        self.table = table
+        self.columns = columns
+        self.column_table = column_table
+
+    @property
+    def rows(self) -> list:
+        """returns the id of the scope of each row"""
+        return [self.compiled.string(*Columns.ROW.unpack_from(
+                    self.compiled.buf, self.table + Columns.ROW.size * i))
+                for i in range(self.count)]
+
+    def row(self, scope_id: str) -> int:
+        """returns the row of an implementing scope"""
+        offset = Binary.find(
+            self.compiled.buf, self.index, self.slots, self.table,
+            Columns.ROW, self.compiled.pool, scope_id)
+        if offset == -1:
+            raise KeyError(scope_id)
+        return (offset - self.table) // Columns.ROW.size
+
+    def decode(self, code: int, start: int, size: int):
+        buf = self.compiled.buf
+        if chr(code) == Columns.TEXT:
+            offsets = array.array('I', buf[start:start + 4 * (self.count + 1)])
+            if sys.byteorder == 'big':
+                offsets.byteswap()
+            data = buf[start + 4 * (self.count + 1):start + size]
+            return [data[offsets[i]:offsets[i + 1]].decode()
+                    for i in range(self.count)]
+
+        values = array.array(
+            'B' if chr(code) == '?' else chr(code), buf[start:start + size])
+        if sys.byteorder == 'big':
+            values.byteswap()
+        return values
+
+    def entries(self):
+        """yields the (name, offset) of each column entry"""
+        for i in range(self.columns):
+            offset = self.column_table + Columns.COLUMN.size * i
+            yield self.compiled.string(*Columns.COLUMN.unpack_from(
+                self.compiled.buf, offset)[:2]), offset
+
+    def __getitem__(self, symbol: str):
+        for name, offset in self.entries():
+            if name == symbol:
+                return self.decode(*Columns.COLUMN.unpack_from(
+                    self.compiled.buf, offset)[2:])
+        raise KeyError(symbol)
+
+    def __iter__(self):
+        for name, offset in self.entries():
+            yield name
+
+    def __len__(self) -> int:
+        return self.columns
+
+
+class CompiledMarshal(dict):
+    """
+    Dict of scope ids to dicts of keys to native values,
+    read from a file compiled to the marshal format
+    """
+    def __init__(self, fileobj):
+        with fileobj:
+            # loads is several times faster than reading the file object
+            super().__init__(marshal.loads(fileobj.read()))
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def map_file(fileobj):
+    """memory maps a file opened in binary mode"""
+    try:
+        return mmap.mmap(fileobj.fileno(), 0, access=mmap.ACCESS_READ)
+    except ValueError:
+        # empty files cannot be mapped
+        return b''
+
+
+def close_map(buf):
+    if isinstance(buf, mmap.mmap):
+        buf.close()
+
+
+def load(path: str) -> Mapping:
+    """opens a compiled file, returns a read only mapping of
+    scope ids to mappings of keys to values
+
+        config = super_ini.load('out.ini')
+        damage = config['Weapons']['Melltith']
+
+    the ini, binary and columnar formats can be loaded, and scopes
+    are only decoded when they are accessed, the marshal format is
+    loaded at once
+    """
+    f = open(path, 'rb')
+    magic = f.read(len(Binary.MAGIC))
+    if magic == Binary.MAGIC:
+        return CompiledBinary(f)
+    if magic == Columns.MAGIC:
+        return CompiledColumns(f)
+    if magic + f.read(len(MARSHAL_MAGIC) - len(magic)) == MARSHAL_MAGIC:
+        return CompiledMarshal(f)
+    return CompiledIni(f)
+
+
+def get_stats(lut: dict, memory: bool = False) -> dict:
+    """returns the number of scopes (objects) and keys in a look up table,
+    and of the ones compiled to the output format (the ones that are not
+    internal, or the tables and rows of the columnar format), with
+    `memory` set the memory they use is also returned, see `memory_stats`
+    """
+    stats = {'objects': 0, 'iobjects': 0, 'keys': 0, 'ikeys': 0}
+
+    for sc in lut:
+        stats['objects'] += 1
         if lut[sc].internal:
             stats['iobjects'] += 1
             stats['ikeys'] += len(lut[sc].lut)
@@ -716,66 +3195,937 @@ def get_stats(lut: dict) -> dict:
 
     stats['pobjects'] = stats['objects'] - stats['iobjects']
     stats['pkeys'] = stats['keys'] - stats['ikeys']
+    if output_format()[0] is compile_columns:
+        # the columnar format writes the abstract scopes, internal
+        # or not, as tables with a row for each scope implementing them
+        tables = columns_tables(lut)
+        stats['pobjects'] = len(tables)
+        stats['pkeys'] = sum(len(rows) for rows in tables.values())
+    if memory:
+        stats['memory'] = memory_stats(lut, context().extern_parsed)
     return stats
 
 
+def peak_rss() -> int:
+    """returns the peak resident memory of the process in bytes,
+    or 0 when it is not available
+    """
+    if resource is None:
+        return 0
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on linux, bytes on macos
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+
+def memory_stats(lut: dict, extern_parsed: list = ()) -> dict:
+    """returns the approximate bytes used by a merged look up table,
+    measured with sys.getsizeof, by class, by file and by scope.
+
+    Objects shared by several scopes, such as interned keys and
+    type names, are only counted once. The look up tables of
+    included files in `extern_parsed` only hold references to
+    scopes in the merged look up table, only the tables are counted
+    """
+    seen = set()
+
+    def size(obj) -> int:
+        if obj is None or id(obj) in seen:
+            return 0
+        seen.add(id(obj))
+        return sys.getsizeof(obj)
+
+    classes = OrderedDict((name, [0, 0]) for name in (
+        'Scope', 'Value', 'Trace', 'keys', 'values', 'templates',
+        'natives', 'global lut', 'extern_parsed'))
+    files = {}
+    scopes = {}
+
+    def count(name: str, nbytes: int, number: int = 1) -> int:
+        classes[name][0] += number
+        classes[name][1] += nbytes
+        return nbytes
+
+    count('global lut', size(lut))
+    for parsed in extern_parsed:
+        count('extern_parsed', size(parsed))
+
+    for obj in lut.values():
+        nbytes = count('Scope', size(obj) + size(obj.lut) + size(
+            obj.closures) + size(obj.symbols) + sum(map(size, obj.symbols)))
+        if obj.trace is not None:
+            nbytes += count('Trace', size(obj.trace) + size(obj.trace.path))
+
+        for key, value_obj in obj.lut.items():
+            nbytes += count('Value', size(value_obj))
+            nbytes += count('keys', size(key))
+            nbytes += count('values', size(value_obj.value) + size(
+                value_obj.type))
+            if value_obj.native is not None:
+                nbytes += count('natives', size(value_obj.native))
+            if value_obj.template is not None:
+                nbytes += count('templates', size(value_obj.template) + sum(
+                    size(chunk) for chunk in value_obj.template))
+
+        path = obj.trace.path if obj.trace else ''
+        files[path] = files.get(path, 0) + nbytes
+        scopes[(path, obj.id)] = nbytes
+
+    return {
+        'total': sum(nbytes for number, nbytes in classes.values()),
+        'classes': OrderedDict((name, {'count': number, 'bytes': nbytes})
+                               for name, (number, nbytes) in classes.items()),
+        'files': files,
+        'scopes': scopes,
+        'peak_rss': peak_rss(),
+    }
+
+
+def memory_summary(memory: dict, top: int = PROFILE_TOP) -> str:
+    """returns a table of the memory returned by `memory_stats`"""
+    rows = ['{0}memory:{1} {2:.1f} MiB, peak rss {3:.1f} MiB'.format(
+        Term.OKBLUE, Term.ENDC, memory['total'] / 2 ** 20,
+        memory['peak_rss'] / 2 ** 20)]
+    for name, counts in memory['classes'].items():
+        rows.append('  {0:<16} {1:>10} objects {2:>12.1f} KiB'.format(
+            name, counts['count'], counts['bytes'] / 1024))
+
+    rows.append('{0}files:{1}'.format(Term.OKBLUE, Term.ENDC))
+    for path, nbytes in sorted(memory['files'].items(),
+                               key=lambda item: -item[1])[:top]:
+        rows.append('  {0:>12.1f} KiB {1}'.format(nbytes / 1024, path))
+
+    rows.append('{0}largest scopes:{1}'.format(Term.OKBLUE, Term.ENDC))
+    for (path, scope_id), nbytes in sorted(memory['scopes'].items(),
+                                           key=lambda item: -item[1])[:top]:
+        rows.append('  {0:>12.1f} KiB {1} [{2}]'.format(
+            nbytes / 1024, path, scope_id))
+    return '\n'.join(rows)
+
+
+def hash_file(path: str) -> str:
+    """returns the sha256 hex digest of a file's content"""
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def hash_env(env: dict) -> str:
+    """returns a hex digest of the compiler environment"""
+    env = sorted((str(k), str(v)) for k, v in env.items())
+    return hashlib.sha256(repr(env).encode()).hexdigest()
+
+
+def cache_manifest_path(cache_dir: str, input_file: str, env: dict) -> str:
+    """returns the path of the manifest for an input file compiled
+    with the environment set from the command line
+    """
+    key = os.path.realpath(input_file) + hash_env(env)
+    key = hashlib.sha256(key.encode()).hexdigest()
+    return os.path.join(cache_dir, key + '.json')
+
+
+def cache_key(files: list, env: dict) -> str:
+    """returns the cache key of a compilation, files is a list of
+    (path, digest) pairs for the input file and every included file
+    """
+    h = hashlib.sha256()
+    for path, digest in files:
+        h.update(digest.encode())
+    h.update(hash_env(env).encode())
+    return h.hexdigest()
+
+
+def cache_lookup(cache_dir: str, input_file: str, env: dict) -> dict:
+    """returns the manifest of a cached compilation if the input file,
+    every file it included and the environment have not changed since
+    """
+    try:
+        with open(cache_manifest_path(cache_dir, input_file, env)) as f:
+            manifest = json.load(f)
+        for path, digest in manifest['files']:
+            if hash_file(path) != digest:
+                # a source file changed
+                return None
+        # refresh the entry's age
+        os.utime(manifest['entry'])
+    except (IOError, ValueError, KeyError):
+        return None
+    return manifest
+
+
+def cache_store(cache_dir: str, input_file: str, env: dict, manifest: dict):
+    """stores the manifest of a compilation and evicts stale entries"""
+    path = cache_manifest_path(cache_dir, input_file, env)
+    replace_file(path, json.dumps(manifest).encode())
+    cache_evict(cache_dir)
+
+
+def cache_evict(cache_dir: str):
+    """removes cache entries older than `cache_max_age`, then removes
+    the least recently used entries until the cache fits `cache_max_size`
+    """
+    env = context().env
+    max_age = float(env.get('cache_max_age', CACHE_MAX_AGE))
+    max_size = int(env.get('cache_max_size', CACHE_MAX_SIZE))
+    now = time.time()
+    entries = []
+
+    for name in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, name)
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        if now - st.st_mtime > max_age:
+            remove_entry(path)
+            continue
+        if name.endswith('.tmp'):
+            # still being written by another compiler
+            continue
+        entries.append((st.st_mtime, st.st_size, path))
+
+    size = sum(e[1] for e in entries)
+    # oldest entries first
+    for mtime, entry_size, path in sorted(entries):
+        if size <= max_size:
+            break
+        remove_entry(path)
+        size -= entry_size
+
+
+def remove_entry(path: str):
+    """removes a cache entry, unless another compiler sharing the
+    cache directory removed it first
+    """
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def parse_args(args: list) -> list:
+    """stores command line options in the environment of
+    the active compiler, returns the remaining positional arguments
+    """
+    env = context().env
+    positional = []
+    args = iter(args)
+
+    for arg in args:
+        if arg in FLAGS:
+            env[FLAGS[arg]] = True
+            continue
+        if arg in OPTIONS:
+            value = next(args, None)
+            if value is None:
+                fail(Err.OPTION_ARGUMENT, extra=arg)
+            if OPTIONS[arg] in INTEGER_OPTIONS and not is_positive(value):
+                fail(Err.OPTION_VALUE, extra='{0} {1}'.format(arg, value))
+            env[OPTIONS[arg]] = value
+            continue
+        positional.append(arg)
+    return positional
+
+
+def write_output(compiled: str, output_file: str):
+    """copies an already compiled file to output_file or the console"""
+    if output_file in ('--dump', '-d'):
+        print('\n{0}output:{1}'.format(Term.OKBLUE, Term.ENDC))
+        sys.stdout.flush()
+        with open(compiled, 'rb') as f:
+            shutil.copyfileobj(f, sys.stdout.buffer)
+        print()
+        return
+
+    try:
+        if os.path.isfile(output_file) and filecmp.cmp(
+                compiled, output_file, shallow=False):
+            print('{0}{1}OK:{2} {3} is up to date'.format(
+                Term.OKGREEN, Term.BOLD, Term.ENDC, output_file))
+            return
+        shutil.copyfile(compiled, output_file)
+    except IOError as e:
+        fail(Err.NO_OUTPUT, extra=e.args)
+
+    print('{0}{1}OK:{2} written to {3}'.format(
+        Term.OKGREEN, Term.BOLD, Term.ENDC, output_file))
+
+
+def write_compiled(lut: dict, output_file: str):
+    """compiles a look up table to output_file or the console"""
+    if output_file in ('--dump', '-d'):
+        # dump compiled to console
+        print('\n{0}output:{1}'.format(Term.OKBLUE, Term.ENDC))
+        compiler, mode = output_format()
+        if mode == 'w':
+            compiler(lut, sys.stdout)
+        else:
+            sys.stdout.flush()
+            compiler(lut, sys.stdout.buffer)
+        print()
+        return
+
+    try:
+        # compile lookup table to output_file
+        written = update_file(lut, output_file)
+    except IOError as e:
+        fail(Err.NO_OUTPUT, extra=e.args)
+
+    if not written:
+        print('{0}{1}OK:{2} {3} is up to date'.format(
+            Term.OKGREEN, Term.BOLD, Term.ENDC, output_file))
+        return
+    print('{0}{1}OK:{2} written to {3}'.format(
+        Term.OKGREEN, Term.BOLD, Term.ENDC, output_file))
+
+
+class Watcher:
+    """
+    Recompiles the input file whenever it, or a file it includes,
+    changes.
+
+    Files are polled every `watch_interval` seconds for changes to
+    their modification time or size. Only the first stage of parsing
+    of a changed file is run again, its scopes are compared with the
+    signatures recorded before they were last resolved, and only the
+    scopes that changed, or depend on a scope that changed, are
+    resolved again:
+
+        [S] :: inline :T    ; T is dirty when S changes, and S is
+                            ; dirty when T changes
+        x = T::y            ; dirty when T changes
+        [X] :: as :T        ; dirty when T changes
+
+    Other scopes keep the look up table they were resolved to.
+    Changes to scopes that call `include` or `setenv`, or a failed
+    compilation, recompile every file
+    """
+    def __init__(self, input_file: str, output_file: str, env: dict):
+        self.input_file = input_file
+        self.output_file = output_file
+        self.compiler = Compiler(env, echo=True)
+        self.root = None
+        self.stats = {}
+        self.failed = False
+
+    def stat(self) -> dict:
+        """returns the (modification time, size) of every watched file"""
+        stats = {}
+        paths = self.compiler.include_graph.paths
+        for node in [os.path.realpath(self.input_file)] + list(paths):
+            try:
+                stats[node] = file_version(node)
+            except OSError:
+                stats[node] = None
+        return stats
+
+    def compile(self):
+        """parses every file and compiles the output"""
+        self.compiler.reset()
+        include_graph = self.compiler.include_graph
+        include_graph.signatures = {}
+        try:
+            with open(self.input_file, 'r') as f:
+                node = include_graph.enter(self.input_file)
+                lut = build(lines(f), self.input_file)
+                include_graph.signatures[node] = scope_signatures(lut)
+                lut = resolve(lut)
+                include_graph.leave()
+        except IOError as e:
+            fail(Err.NO_INPUT, extra=e.args)
+        finally:
+            include_graph.shutdown()
+
+        include_graph.parsed[node] = lut
+        self.root = node
+        self.write()
+
+    def dirty(self, lut: dict, signatures: dict, previous: dict) -> set:
+        """returns the id of every scope in a rebuilt look up table that
+        has to be resolved again, or None if every file has to be
+        """
+        changed = set(scope_id for scope_id in set(signatures) | set(previous)
+                      if signatures.get(scope_id) != previous.get(scope_id))
+
+        for scope_id in changed:
+            for closures, symbols, values in (
+                    signatures.get(scope_id, ((), (), ())),
+                    previous.get(scope_id, ((), (), ()))):
+                if 'include' in closures or 'setenv' in closures:
+                    return None
+
+        # scopes that have to be resolved again when a scope changes
+        dependents = {}
+        for obj in lut.values():
+            target = obj.symbols[0] if obj.symbols else None
+            if CLOSURES['inline'] in obj.closures:
+                # the target holds a value inlined by this scope, and
+                # a rebuilt target has to be inlined into again
+                dependents.setdefault(obj.id, set()).add(target)
+                dependents.setdefault(target, set()).add(obj.id)
+            if CLOSURES['as'] in obj.closures:
+                dependents.setdefault(target, set()).add(obj.id)
+            for value_obj in obj.lut.values():
+                for chunk in value_obj.template or ():
+                    if type(chunk) is tuple:
+                        dependents.setdefault(chunk[0], set()).add(obj.id)
+
+        for scope_id in list(changed):
+            closures, symbols, values = previous.get(scope_id, ((), (), ()))
+            if 'inline' in closures:
+                # the previous version of this scope was inlined
+                changed.add(symbols[0])
+
+        dirty = set()
+        stack = list(changed)
+        while stack:
+            scope_id = stack.pop()
+            if scope_id in dirty:
+                continue
+            dirty.add(scope_id)
+            stack.extend(dependents.get(scope_id, ()))
+        return dirty
+
+    def update(self, node: str) -> bool:
+        """rebuilds a changed file, returns False if every
+        file has to be recompiled instead
+        """
+        include_graph = self.compiler.include_graph
+        if node not in include_graph.parsed:
+            # the file was skipped, it may now define a requested scope
+            return False
+        path = include_graph.paths[node]
+        with open(path, 'r') as f:
+            lut = build(lines(f), path)
+
+        signatures = scope_signatures(lut)
+        dirty = self.dirty(lut, signatures, include_graph.signatures[node])
+        if dirty is None:
+            return False
+
+        previous = include_graph.parsed[node]
+        only = only_scopes()
+        if only is not None:
+            # scopes selected since the last compilation were not resolved
+            dirty |= select_scopes(lut, only) - select_scopes(previous, only)
+        # reuse the resolved scopes that did not change
+        for scope_id in lut:
+            if scope_id not in dirty:
+                lut[scope_id] = previous[scope_id]
+        resolve(lut, dirty)
+
+        include_graph.signatures[node] = signatures
+        include_graph.parsed[node] = lut
+        extern_parsed = self.compiler.extern_parsed
+        for i, parsed in enumerate(extern_parsed):
+            if parsed is previous:
+                extern_parsed[i] = lut
+
+        print('{0}{1}OK:{2} resolved {3} of {4} objects in {5}'.format(
+            Term.OKGREEN, Term.BOLD, Term.ENDC,
+            len(dirty & set(lut)), len(lut), path))
+        return True
+
+    def write(self):
+        """merges the look up table of every file and compiles them"""
+        look_up_table = OrderedDict(
+            self.compiler.include_graph.parsed[self.root])
+        for parsed in self.compiler.extern_parsed:
+            look_up_table.update(parsed)
+        look_up_table = select_output(look_up_table)
+
+        output_file = self.output_file
+        if output_file is None:
+            if 'output' not in self.compiler.env:
+                fail(Err.NO_OUTPUT)
+            output_file = self.compiler.env['output']
+
+        stats = get_stats(look_up_table)
+        print('{0}{1}OK:{2} compiled {3} objects, {4} keys'.format(
+            Term.OKGREEN, Term.BOLD, Term.ENDC,
+            stats['pobjects'], stats['pkeys']))
+        write_compiled(look_up_table, output_file)
+
+    def check(self):
+        """recompiles the files that changed since the last check"""
+        stats = self.stat()
+        changed = [node for node in stats if stats[node] != self.stats.get(node)]
+
+        try:
+            with self.compiler:
+                self.recompile(stats, changed)
+            self.failed = False
+        except CompileError:
+            # errors were already printed,
+            # keep watching until the files are fixed
+            self.failed = True
+
+        # files included while compiling are watched as well, files
+        # changed while compiling are recompiled by the next check
+        self.stats = self.stat()
+        self.stats.update((node, stats[node]) for node in stats
+                          if node in self.stats)
+
+    def recompile(self, stats: dict, changed: list):
+        """recompiles the changed files, or every file"""
+        # the diagnostics of the last check were already printed
+        self.compiler.diagnostics = []
+        if self.root is None or self.failed or any(
+                stats[node] is None for node in changed):
+            self.compile()
+            return
+
+        for node in changed:
+            if not self.update(node):
+                self.compile()
+                return
+        self.write()
+
+    def run(self):
+        """compiles the input file, then recompiles it
+        until interrupted
+        """
+        try:
+            while True:
+                self.check()
+                # the interval may be set by a setenv closure
+                interval = float(self.compiler.env.get(
+                    'watch_interval', WATCH_INTERVAL))
+                print('{0}watching {1} files{2}'.format(
+                    Term.OKBLUE, len(self.stats), Term.ENDC))
+                sys.stdout.flush()
+                while self.stat() == self.stats:
+                    time.sleep(interval)
+        except KeyboardInterrupt:
+            pass
+
+
+def read_manifest(path: str) -> list:
+    """reads a batch manifest, returns its (input_file, output_file)
+    targets, output_file is None when the target sets it with setenv
+
+        ; input_file  output_file
+        items.ini     out/items.ini
+        enemies.ini
+    """
+    targets = []
+    try:
+        with open(path, 'r') as f:
+            for i, ln in enumerate(lines(f)):
+                target = ln.split(Token.COMMENT)[0].split()
+                if len(target) > 2:
+                    fail(Err.UNDEFINED, Trace(path, i + 1, '', ''), ln)
+                if target:
+                    targets.append((target[0], (target + [None])[1]))
+    except IOError as e:
+        fail(Err.NO_INPUT, extra=e.args)
+    return targets
+
+
+def compile_batch(targets: list, env: dict) -> list:
+    """compiles each (input_file, output_file) target with a compiler
+    created with env, as if each target was compiled by a separate run,
+    included files are only parsed once for all targets. returns the
+    input files that failed to compile
+    """
+    shared = {}
+    failed = []
+
+    for input_file, output_file in targets:
+        print('{0}{1}:{2}'.format(Term.OKBLUE, input_file, Term.ENDC))
+        try:
+            with Compiler(env, shared, echo=True):
+                compile_input(input_file, output_file, env)
+        except CompileError:
+            # errors were already printed
+            failed.append(input_file)
+    sys.stdout.flush()
+    return failed
+
+
+def run_batch(targets: list, env: dict) -> list:
+    """compiles batch targets, split in `jobs` groups that are
+    compiled in worker processes, returns the input files that
+    failed to compile
+    """
+    jobs = min(int(env.get('jobs', 1)), len(targets))
+
+    if jobs < 2:
+        failed = compile_batch(targets, env)
+    else:
+        # targets are compiled in parallel instead
+        # of the files they include
+        env = dict(env)
+        del env['jobs']
+        size = -(-len(targets) // jobs)
+        groups = [targets[i:i + size] for i in range(0, len(targets), size)]
+        sys.stdout.flush()
+        with ProcessPoolExecutor(jobs) as pool:
+            failed = sum(pool.map(compile_batch, groups,
+                                  [env] * len(groups)), [])
+
+    if failed:
+        print('{0}{1}error:{2} {3} of {4} targets failed: {5}'.format(
+            Term.FAIL, Term.BOLD, Term.ENDC,
+            len(failed), len(targets), ', '.join(failed)))
+    else:
+        print('{0}{1}OK:{2} compiled {3} targets'.format(
+            Term.OKGREEN, Term.BOLD, Term.ENDC, len(targets)))
+    return failed
+
+
+class LRUCache(OrderedDict):
+    """
+    Look up tables of included files shared by the compilers of a
+    compile server, the least recently used are dropped once there
+    are more than `size` of them
+    """
+    def __init__(self, size: int):
+        super().__init__()
+        self.size = size
+        self.lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self.lock:
+            if key not in self:
+                return default
+            self.move_to_end(key)
+            return self[key]
+
+    def __setitem__(self, key, value):
+        with self.lock:
+            super().__setitem__(key, value)
+            self.move_to_end(key)
+            while len(self) > self.size:
+                self.popitem(last=False)
+
+
+class Server:
+    """
+    Compiles requests received over a unix socket, so the included
+    files, references and eval expressions they share are only
+    parsed, resolved and compiled once.
+
+    Requests and responses are json objects, one per line:
+
+        {"input": "items.ini", "output": "out.ini",
+         "env": {"format": "bin"}, "cwd": "/home/project"}
+
+        {"ok": true, "output": "out.ini", "stats": {...},
+         "diagnostics": ["warning[W01]: ..."]}
+
+    `output`, `env` and `cwd` are optional. Requests are compiled one
+    at a time in the request's working directory, since included
+    files are opened relative to it
+    """
+    def __init__(self, socket_path: str, env: dict):
+        self.socket_path = socket_path
+        self.env = env
+        self.shared = LRUCache(
+            int(env.get('serve_cache_size', SERVE_CACHE_SIZE)))
+        self.cwd = os.getcwd()
+
+    def compile(self, request: dict) -> dict:
+        """compiles a request, returns the response"""
+        env = dict(self.env)
+        env.update(request.get('env') or {})
+        compiler = Compiler(env, self.shared)
+        output_file = request.get('output')
+
+        try:
+            os.chdir(request.get('cwd') or self.cwd)
+            lut = compiler.parse(request['input'], profiling=True)
+            with compiler:
+                if output_file is None:
+                    if 'output' not in compiler.env:
+                        fail(Err.NO_OUTPUT)
+                    output_file = compiler.env['output']
+                try:
+                    update_file(lut, output_file)
+                except IOError as e:
+                    fail(Err.NO_OUTPUT, extra=e.args)
+        except CompileError:
+            pass
+        finally:
+            os.chdir(self.cwd)
+            # do not trace the allocations of later requests
+            compiler.stop_profiler()
+
+        ok = not any(d.level == 'error' for d in compiler.diagnostics)
+        response = {
+            'ok': ok,
+            'diagnostics': [str(d) for d in compiler.diagnostics],
+        }
+        if ok:
+            response['output'] = output_file
+            with compiler:
+                # the stats depend on the output format
+                response['stats'] = get_stats(lut)
+        return response
+
+    async def handle(self, reader, writer):
+        """answers the requests of a client until it disconnects"""
+        loop = asyncio.get_running_loop()
+
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            try:
+                request = json.loads(line)
+                if 'input' not in request:
+                    raise ValueError('missing input')
+            except ValueError as e:
+                response = {'ok': False, 'diagnostics': [
+                    'error: invalid request {0}'.format(e)]}
+            else:
+                try:
+                    response = await loop.run_in_executor(
+                        self.executor, self.compile, request)
+                except Exception as e:
+                    # keep serving other requests
+                    response = {'ok': False, 'diagnostics': [
+                        'error: {0!r}'.format(e)]}
+            writer.write(json.dumps(response).encode() + b'\n')
+            await writer.drain()
+        writer.close()
+
+    async def serve(self):
+        """listens on the socket until cancelled"""
+        if os.path.exists(self.socket_path):
+            # left behind by a server that was not stopped cleanly
+            os.remove(self.socket_path)
+        # a single thread compiles requests, since
+        # they change the working directory
+        self.executor = ThreadPoolExecutor(1)
+        server = await asyncio.start_unix_server(
+            self.handle, path=self.socket_path)
+        # stop serving when the server is terminated
+        asyncio.get_running_loop().add_signal_handler(
+            signal.SIGTERM, server.close)
+
+        print('{0}{1}OK:{2} listening on {3}'.format(
+            Term.OKGREEN, Term.BOLD, Term.ENDC, self.socket_path))
+        sys.stdout.flush()
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.executor.shutdown()
+            os.remove(self.socket_path)
+
+    def run(self):
+        """serves requests until interrupted"""
+        try:
+            asyncio.run(self.serve())
+        except (KeyboardInterrupt, asyncio.CancelledError):
+            pass
+
+
+def request(socket_path: str, input_file: str, output_file: str = None,
+            env: dict = None) -> dict:
+    """sends a compile request to a server started with `--serve`,
+    returns the server's response
+    """
+    message = {
+        'input': input_file,
+        'output': output_file,
+        'env': env or {},
+        'cwd': os.getcwd(),
+    }
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path)
+        sock.sendall(json.dumps(message).encode() + b'\n')
+        with sock.makefile('rb') as f:
+            return json.loads(f.readline())
+
+
 def main(args):
+    if len(args) > 0 and args[0] in ('-h', '--help'):
+        print(__doc__)
+        return
+
+    try:
+        run(parse_args(args))
+    except CompileError:
+        # errors were already printed
+        exit(-1)
+
+
+def run(args: list):
+    """compiles the positional command line arguments with
+    the environment set by the command line options
+    """
+    env = context().env
+
+    if 'batch' in env:
+        # environment shared by every target, the batch
+        # manifest is not part of it
+        env = dict(env)
+        targets = read_manifest(env.pop('batch'))
+        targets += [(args[i], args[i + 1] if i + 1 < len(args) else None)
+                    for i in range(0, len(args), 2)]
+        if run_batch(targets, env):
+            exit(-1)
+        return
+
+    if 'serve' in env:
+        env = dict(env)
+        Server(env.pop('serve'), env).run()
+        return
+
     if len(args) < 1:
         fail(Err.NO_INPUT)
 
-    if args[0] in ('-h', '--help'):
-        print(__doc__)
+    if 'connect' in env:
+        env = dict(env)
+        try:
+            response = request(env.pop('connect'), args[0],
+                               args[1] if len(args) > 1 else None, env)
+        except OSError as e:
+            fail(Err.NO_SERVER, extra=e.args)
+        for diagnostic in response['diagnostics']:
+            print(diagnostic + '\n')
+        if not response['ok']:
+            exit(-1)
+        print('{0}{1}OK:{2} written to {3}'.format(
+            Term.OKGREEN, Term.BOLD, Term.ENDC, response['output']))
         return
 
     input_file = args[0]
+    output_file = args[1] if len(args) > 1 else None
+    # environment set from the command line, before
+    # any setenv closure has been called
+    cli_env = dict(env)
 
-    try:
-        # read and parse source file
-        with open(input_file, 'r') as f:
-            look_up_table = parse(f.read(), input_file)
-    except IOError as e:
-        fail(Err.NO_INPUT, extra=e.args)
+    if env_true('watch'):
+        Watcher(input_file, output_file, cli_env).run()
+        return
+
+    with Compiler(cli_env, echo=True):
+        compile_input(input_file, output_file, cli_env)
 
-    for parsed in extern_parsed:
-        # update look up table with files parsed externally
-        look_up_table.update(parsed)
 
+def compile_input(input_file: str, output_file: str, cli_env: dict):
+    """compiles an input file with the active compiler to output_file,
+    or to the `output` env flag when output_file is None
+    """
+    compiler = context()
+
+    if 'cache' in compiler.env and 'delta' not in compiler.env:
+        # the delta file is compiled from the look up table
+        manifest = cache_lookup(compiler.env['cache'], input_file, cli_env)
+        if manifest is not None:
+            # nothing changed since the last compilation,
+            # skip parsing and compiling
+            stats = manifest['stats']
+            print('{0}{1}OK:{2} cached {3} objects, {4} keys'.format(
+                Term.OKGREEN, Term.BOLD, Term.ENDC,
+                stats['pobjects'], stats['pkeys']))
+            if output_file is None and manifest['output'] is None:
+                fail(Err.NO_OUTPUT)
+            write_output(manifest['entry'], output_file or manifest['output'])
+            return
+
+    look_up_table = compiler.parse(input_file, profiling=True)
+    # environment updated by setenv closures
+    env = compiler.env
     stats = get_stats(look_up_table)
 
     print('{0}{1}OK:{2} parsed {3} objects ({4} internal), {5} keys'.format(
         Term.OKGREEN, Term.BOLD, Term.ENDC,
         stats['objects'], stats['iobjects'], stats['keys']))
 
-    if len(args) < 2:
-        # no ouput file provide, assume it is defined in env_flags
-        if 'output' not in env_flags:
+    if output_file is None:
+        # no ouput file provide, assume it is defined in the environment
+        if 'output' not in env:
             fail(Err.NO_OUTPUT)
-        output_file = env_flags['output']
+        output_file = env['output']
+
+    if 'cache' in env:
+        # the cache directory may also have been set by a setenv closure
+        cache_dir = env['cache']
+        os.makedirs(cache_dir, exist_ok=True)
+        files = [(os.path.abspath(path), hash_file(path))
+                 for path in compiler.include_graph.files()]
+        entry = os.path.abspath(
+            os.path.join(cache_dir, cache_key(files, env) + '.ini'))
+
+        if not os.path.isfile(entry):
+            # compile lookup table to the cache entry, through a
+            # file unique to this compiler (see `replace_file`)
+            fd, tmp = tempfile.mkstemp(
+                prefix=os.path.basename(entry) + '.', suffix='.tmp',
+                dir=cache_dir)
+            os.close(fd)
+            try:
+                compile_file(look_up_table, tmp)
+                os.replace(tmp, entry)
+            except BaseException:
+                remove_entry(tmp)
+                raise
+
+        print('{0}{1}OK:{2} compiled {3} objects, {4} keys'.format(
+            Term.OKGREEN, Term.BOLD, Term.ENDC,
+            stats['pobjects'], stats['pkeys']))
+
+        cache_store(cache_dir, input_file, cli_env, {
+            'files': files,
+            'entry': entry,
+            'output': env.get('output'),
+            'stats': stats,
+        })
+        if 'delta' in env:
+            write_compiled(look_up_table, output_file)
+        else:
+            write_output(entry, output_file)
     else:
-        output_file = args[1]
+        print('{0}{1}OK:{2} compiled {3} objects, {4} keys'.format(
+            Term.OKGREEN, Term.BOLD, Term.ENDC,
+            stats['pobjects'], stats['pkeys']))
 
-    # compile lookup table
-    compiled = compile_text(look_up_table)
+        write_compiled(look_up_table, output_file)
 
-    print('{0}{1}OK:{2} compiled {3} objects, {4} keys'.format(
-        Term.OKGREEN, Term.BOLD, Term.ENDC, stats['pobjects'], stats['pkeys']))
+    if compiler.profiler is not None:
+        write_profile(compiler.profiler, look_up_table)
+        compiler.stop_profiler()
 
-    if output_file in ('--dump', '-d'):
-        # dump compiled to console
-        print('\n{0}output:{1}'.format(Term.OKBLUE, Term.ENDC))
-        print(compiled)
-        # exit
-        return
 
-    try:
-        # write compiled to output_file
-        with open(output_file, 'w') as f:
-            f.write(compiled)
-    except IOError as e:
-        fail(Err.NO_OUTPUT, extra=e.args)
+def write_profile(profiler: Profiler, lut: dict):
+    """prints a profile, and writes it to the `profile_output` env flag,
+    the memory used by lut is included when memory is profiled
+    """
+    env = context().env
+    top = int(env.get('profile_top', PROFILE_TOP))
+    profile = profiler.to_json(top)
+    print()
+    print(profiler.summary(top))
+
+    if profiler.memory:
+        memory = get_stats(lut, memory=True)['memory']
+        print(memory_summary(memory, top))
+        profile['memory'] = {
+            'total': memory['total'],
+            'peak_rss': memory['peak_rss'],
+            'classes': memory['classes'],
+            'files': memory['files'],
+            'scopes': [{'path': path, 'scope': scope_id, 'bytes': nbytes}
+                       for (path, scope_id), nbytes in sorted(
+                           memory['scopes'].items(),
+                           key=lambda item: -item[1])[:top]],
+        }
+
+    if 'profile_output' in env:
+        try:
+            with open(env['profile_output'], 'w') as f:
+                json.dump(profile, f)
+        except IOError as e:
+            fail(Err.NO_OUTPUT, extra=e.args)
+        print('{0}{1}OK:{2} profile written to {3}'.format(
+            Term.OKGREEN, Term.BOLD, Term.ENDC, env['profile_output']))
 
-    print('{0}{1}OK:{2} written to {3}'.format(
-        Term.OKGREEN, Term.BOLD, Term.ENDC, output_file))
 
 if __name__ == '__main__':
     print()
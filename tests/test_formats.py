@@ -0,0 +1,226 @@
+"""
+tests of the output formats, compiles the fixtures in this directory
+with the command line, and loads the compiled files
+
+    python3 -m unittest discover tests
+"""
+
+import importlib.util
+import math
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+import zlib
+
+TESTS = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(TESTS)
+sys.path.insert(0, ROOT)
+
+import super_ini  # noqa: E402
+
+
+class FormatTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def fixture(self, name: str) -> str:
+        """copies a fixture to the test directory, returns its path"""
+        path = os.path.join(self.directory, name)
+        shutil.copy(os.path.join(TESTS, name), path)
+        return path
+
+    def edit(self, path: str, old: str, new: str):
+        """replaces text in a file, its modification time is moved
+        forward so the change is seen even when its size is the same
+        """
+        with open(path, 'r') as f:
+            src = f.read()
+        with open(path, 'w') as f:
+            f.write(src.replace(old, new))
+        st = os.stat(path)
+        os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+
+    def compile(self, *args, cwd: str = None) -> str:
+        """runs the compiler, in the test directory unless `cwd` is
+        set, returns what it printed
+        """
+        return subprocess.check_output(
+            [sys.executable, os.path.join(ROOT, 'super_ini.py')] +
+            list(args), cwd=cwd or self.directory, stderr=subprocess.STDOUT,
+        ).decode()
+
+
+class BinaryTest(FormatTest):
+
+    def test_round_trip(self):
+        src = self.fixture('types.ini')
+        out = os.path.join(self.directory, 'out.bin')
+
+        printed = self.compile('--format', 'bin', src, out)
+        self.assertIn('compiled 2 objects, 10 keys', printed)
+        with super_ini.load(out) as compiled:
+            self.assertIsInstance(compiled, super_ini.CompiledBinary)
+            self.assertEqual(list(compiled), ['__global__', 'Types'])
+            self.assertEqual(dict(compiled['__global__']), {})
+            types = compiled['Types']
+            self.assertEqual(list(types), [str(i) for i in range(10)])
+            self.assertEqual(types['0'], 780)
+            self.assertEqual(types['1'], 127)
+            self.assertEqual(types['3'], 0xFFFF)
+            self.assertEqual(types['4'], -722)
+            self.assertEqual(types['5'], 255)
+            self.assertEqual(types['6'], 3.14159)
+            self.assertEqual(types['7'], 1.28e5)
+            self.assertEqual(types['8'], 'hello world')
+            self.assertIs(types['9'], False)
+
+        self.edit(src, '-722', '-723')
+        printed = self.compile('--format', 'bin', src, out)
+        self.assertNotIn('is up to date', printed)
+        with super_ini.load(out) as compiled:
+            self.assertEqual(compiled['Types']['4'], -723)
+
+        printed = self.compile('--format', 'bin', src, out)
+        self.assertIn('is up to date', printed)
+
+    def test_lookup(self):
+        src = self.fixture('binary.ini')
+        out = os.path.join(self.directory, 'out.bin')
+        self.compile('--format', 'bin', src, out)
+
+        def slot(name: str, count: int) -> int:
+            mask = super_ini.Binary.slots(count) - 1
+            return zlib.crc32(name.encode()) & mask
+
+        scopes = ['__global__', 'Eirlithrad', 'Gwyhyr', 'Negotiator']
+        keys = ['weight', 'price', 'range', 'durability']
+        self.assertEqual({slot(scope_id, 4) for scope_id in scopes}, {1})
+        self.assertEqual({slot(key, 4) for key in keys}, {1})
+
+        with super_ini.load(out) as compiled:
+            self.assertEqual(list(compiled), scopes)
+            self.assertEqual(compiled['Gwyhyr']['weight'], 3.0)
+            self.assertEqual(compiled['Negotiator']['weight'], 3.25)
+            scope = compiled['Eirlithrad']
+            self.assertEqual(list(scope), keys)
+            self.assertEqual(dict(scope), {
+                'weight': 3.5, 'price': 1200,
+                'range': 'melee', 'durability': 200})
+
+            # missing names are probed past the colliding entries
+            self.assertEqual(slot('Ultimatum', 4), 1)
+            with self.assertRaises(KeyError):
+                compiled['Ultimatum']
+            self.assertEqual(slot('slash', 4), 1)
+            with self.assertRaises(KeyError):
+                scope['slash']
+            self.assertNotIn('damage', scope)
+            self.assertIsNone(compiled.get('Weapons'))
+
+
+class ColumnsTest(FormatTest):
+
+    def test_internal_abstract(self):
+        src = self.fixture('columns.ini')
+        out = os.path.join(self.directory, 'out.cols')
+
+        printed = self.compile('--format', 'cols', src, out)
+        self.assertIn('compiled 1 objects, 2 keys', printed)
+        with super_ini.load(out) as compiled:
+            self.assertEqual(list(compiled['Weapons']['damage']), [275, 355])
+
+        self.edit(src, '275', '999')
+        printed = self.compile('--format', 'cols', src, out)
+        self.assertNotIn('is up to date', printed)
+        with super_ini.load(out) as compiled:
+            self.assertEqual(list(compiled['Weapons']['damage']), [999, 355])
+
+        printed = self.compile('--format', 'cols', src, out)
+        self.assertIn('is up to date', printed)
+
+    def test_only(self):
+        out = os.path.join(self.directory, 'out.cols')
+        # files are included relative to the working directory
+        printed = self.compile('--only', 'Weapons', '--format', 'cols',
+                               'test_all.ini', out, cwd=TESTS)
+        self.assertIn('compiled 1 objects, 2 keys', printed)
+
+        with super_ini.load(out) as compiled:
+            self.assertEqual(list(compiled), ['Weapons'])
+            table = compiled['Weapons']
+            self.assertEqual(table.rows, ['Eirlithrad', 'Melltith'])
+            self.assertEqual(list(table['damage']), [275, 355])
+            self.assertEqual(list(table['level']), ['18', '26'])
+
+
+class DeltaTest(FormatTest):
+
+    def test_delta(self):
+        src = self.fixture('types.ini')
+        with open(src, 'a') as f:
+            f.write('\n[Extra]\nx = 1\n\n[Removed]\ny = 2\n')
+        out = os.path.join(self.directory, 'out.ini')
+        delta = os.path.join(self.directory, 'delta.ini')
+
+        printed = self.compile(src, out, '--delta', delta)
+        self.assertNotIn('is up to date', printed)
+        with super_ini.load(delta) as compiled:
+            self.assertEqual(list(compiled),
+                             ['__global__', 'Types', 'Extra', 'Removed'])
+
+        # nothing changed, the output file is not written
+        mtime = os.stat(out).st_mtime_ns
+        printed = self.compile(src, out, '--delta', delta)
+        self.assertIn('is up to date', printed)
+        self.assertEqual(os.stat(out).st_mtime_ns, mtime)
+        with super_ini.load(delta) as compiled:
+            self.assertEqual(dict(compiled), {})
+
+        self.edit(src, '[Removed]\ny = 2\n', '')
+        self.edit(src, 'x = 1', 'x = 3')
+        printed = self.compile(src, out, '--delta', delta)
+        self.assertNotIn('is up to date', printed)
+        with super_ini.load(delta) as compiled:
+            self.assertEqual(list(compiled), ['Extra', 'Removed'])
+            self.assertEqual(dict(compiled['Extra']), {'x': '3'})
+            self.assertEqual(dict(compiled['Removed']), {})
+        with super_ini.load(out) as compiled:
+            self.assertNotIn('Removed', compiled)
+            self.assertEqual(compiled['Extra']['x'], '3')
+
+
+class PythonTest(FormatTest):
+
+    def test_import(self):
+        src = self.fixture('python.ini')
+        out = os.path.join(self.directory, 'limits.py')
+        self.compile('--format', 'py', src, out)
+
+        spec = importlib.util.spec_from_file_location('limits', out)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+
+        limits = module.scopes['Limits']
+        self.assertEqual(module.scopes['Weapons'], {'Melltith': '355 26'})
+        self.assertIs(limits['enabled'], True)
+        self.assertEqual(limits['ratio'], 0.5)
+        self.assertEqual(limits['max'], math.inf)
+        self.assertEqual(limits['min'], -math.inf)
+        self.assertEqual(limits['untyped'], '1e999')
+
+        out = os.path.join(self.directory, 'limits.marshal')
+        self.compile('--format', 'marshal', src, out)
+        with super_ini.load(out) as compiled:
+            self.assertEqual(dict(compiled), module.scopes)
+
+    def test_nan(self):
+        self.assertTrue(math.isnan(eval(super_ini.python_literal(math.nan))))
+
+
+if __name__ == '__main__':
+    unittest.main()
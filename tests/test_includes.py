@@ -0,0 +1,41 @@
+"""
+tests of included files, compiles the fixtures in this directory
+
+    python3 -m unittest discover tests
+"""
+
+import os
+import sys
+import unittest
+
+TESTS = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(TESTS))
+
+import super_ini  # noqa: E402
+
+
+class IncludeTest(unittest.TestCase):
+
+    def setUp(self):
+        # files are included relative to the working directory
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(TESTS)
+
+    def test_cycle(self):
+        for env, shared in (({}, None), ({}, {}), ({'only': 'A'}, None)):
+            compiler = super_ini.Compiler(env, shared)
+            with self.assertRaises(super_ini.CompileError) as error:
+                compiler.compile('include_cycle_a.ini')
+
+            diagnostic = error.exception.diagnostic
+            self.assertEqual(diagnostic.code, 'E11')
+            self.assertEqual(diagnostic.message, 'circular include:')
+            self.assertEqual(diagnostic.extra, (
+                'include_cycle_a.ini -> include_cycle_b.ini'
+                ' -> include_cycle_a.ini'))
+            self.assertEqual(diagnostic.trace.path, 'include_cycle_b.ini')
+            self.assertEqual(diagnostic.trace.line, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
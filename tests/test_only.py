@@ -0,0 +1,68 @@
+"""
+tests of the scopes and included files pruned by the `only` flag
+
+    python3 -m unittest discover tests
+"""
+
+import os
+import sys
+import unittest
+
+TESTS = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(TESTS))
+
+import super_ini  # noqa: E402
+
+
+class OnlyTest(unittest.TestCase):
+
+    def setUp(self):
+        # files are included relative to the working directory
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(TESTS)
+
+    def select(self, only: set) -> set:
+        """returns the scopes of only.ini selected for `only`, but
+        the env scope, which calls setenv
+        """
+        with super_ini.Compiler():
+            lut = super_ini.build_file('only.ini')
+            selected = super_ini.select_scopes(lut, only)
+        self.assertIn('env', selected)
+        return selected - {'env'}
+
+    def test_requested(self):
+        self.assertEqual(self.select({'Prices'}), {'Prices'})
+        self.assertEqual(self.select({'Missing'}), set())
+
+    def test_inline_and_references(self):
+        # implementers inline into Weapons, and reference Levels
+        self.assertEqual(self.select({'Weapons'}),
+                         {'Weapons', 'Melltith', 'Levels'})
+
+    def test_include_defines(self):
+        # only the include of the file that defines Armor is selected
+        self.assertEqual(self.select({'Armor'}), {'0'})
+        self.assertEqual(self.select({'Shields'}), {'1'})
+
+    def test_compile(self):
+        compiler = super_ini.Compiler({'only': 'Weapons, Armor'})
+        output = compiler.compile('only.ini')
+        self.assertEqual(output.split(), [
+            '[Armor]', 'weight=3.5', '[Weapons]', 'Melltith=355', '26'])
+        # set by setenv, which is resolved whatever is requested
+        self.assertEqual(compiler.env['sorted'], 'True')
+        self.assertEqual(compiler.diagnostics, [])
+
+        # pruned scopes and files are not resolved
+        with self.assertRaises(super_ini.CompileError) as error:
+            super_ini.Compiler().compile('only.ini')
+        self.assertEqual(error.exception.diagnostic.trace.path,
+                         'only_skipped.ini')
+        with self.assertRaises(super_ini.CompileError) as error:
+            super_ini.Compiler({'only': 'Broken'}).compile('only.ini')
+        self.assertEqual(error.exception.diagnostic.trace.scope, 'Broken')
+
+
+if __name__ == '__main__':
+    unittest.main()
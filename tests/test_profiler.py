@@ -0,0 +1,84 @@
+"""
+tests of the profiler, enabled from the command line or with setenv
+
+    python3 -m unittest discover tests
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import tracemalloc
+import unittest
+
+TESTS = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(TESTS))
+
+import super_ini  # noqa: E402
+
+
+class SetenvProfileTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def write(self, name: str, src: str) -> str:
+        path = os.path.join(self.directory, name)
+        with open(path, 'w') as f:
+            f.write(src)
+        return path
+
+    def compile(self, path: str) -> super_ini.Compiler:
+        compiler = super_ini.Compiler()
+        self.assertIn('damage=275', compiler.compile(path))
+        self.assertIsNotNone(compiler.profiler)
+        return compiler
+
+    def test_root_file(self):
+        for flag in ('profile', 'memory'):
+            root = self.write('root.ini', (
+                '[env] :: internal, setenv\n{0} = True\n\n'
+                '[Weapons]\ndamage: i32 = 275\n').format(flag))
+            compiler = self.compile(root)
+            self.assertEqual(compiler.profiler.memory, flag == 'memory')
+            # the root file began before profiling was enabled
+            self.assertNotIn(('file', root), compiler.profiler.totals)
+            self.assertIn(('phase', 'compile_to'), compiler.profiler.totals)
+
+    def test_included_file(self):
+        include = self.write('env.ini', (
+            '[env] :: internal, setenv\nmemory = True\n'))
+        root = self.write('root.ini', (
+            '[0] :: internal, include :{0}\n\n'
+            '[Weapons]\ndamage: i32 = 275\n').format(include))
+        self.compile(root)
+
+    def test_memory_stopped(self):
+        root = self.write('root.ini', '[Weapons]\ndamage: i32 = 275\n')
+        compiler = super_ini.Compiler({'memory': True})
+        compiler.compile(root)
+        self.assertFalse(tracemalloc.is_tracing())
+        self.assertIn(('phase', 'compile_to'), compiler.profiler.totals)
+        compiler.parse(root)
+        self.assertFalse(tracemalloc.is_tracing())
+
+        root = self.write('root.ini', (
+            '[env] :: internal, setenv\nmemory = True\n\n'
+            '[Weapons]\ndamage: i32 = 275\n'))
+        self.compile(root)
+        self.assertFalse(tracemalloc.is_tracing())
+        super_ini.Compiler().parse(root)
+        self.assertFalse(tracemalloc.is_tracing())
+
+    def test_memory_traced_before(self):
+        # tracing started by the caller is left to the caller
+        tracemalloc.start()
+        self.addCleanup(tracemalloc.stop)
+        root = self.write('root.ini', '[Weapons]\ndamage: i32 = 275\n')
+        super_ini.Compiler({'memory': True}).compile(root)
+        self.assertTrue(tracemalloc.is_tracing())
+
+
+if __name__ == '__main__':
+    unittest.main()
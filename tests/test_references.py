@@ -0,0 +1,41 @@
+"""
+tests of reference resolution, compiles the fixtures in this directory
+
+    python3 -m unittest discover tests
+"""
+
+import os
+import sys
+import unittest
+
+TESTS = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(TESTS))
+
+import super_ini  # noqa: E402
+
+
+class ReferenceTest(unittest.TestCase):
+
+    def test_not_inlined(self):
+        compiler = super_ini.Compiler()
+        lut = compiler.parse(os.path.join(TESTS, 'unresolved.ini'))
+
+        self.assertEqual(lut['B'].lut['y'].value, 'A::C tail')
+        self.assertEqual(lut['Stats'].lut['foo'].value, 'Weapons::Foo')
+        self.assertEqual(
+            [(d.code, d.extra, d.trace.line) for d in compiler.diagnostics],
+            [('W01', 'C', 6), ('W01', 'Foo', 15)])
+
+    def test_cycle(self):
+        compiler = super_ini.Compiler()
+        with self.assertRaises(super_ini.CompileError) as error:
+            compiler.parse(os.path.join(TESTS, 'reference_cycle.ini'))
+
+        diagnostic = error.exception.diagnostic
+        self.assertEqual(diagnostic.code, 'E12')
+        self.assertEqual(diagnostic.extra, 'a::x -> b::y -> c::z -> a::x')
+        self.assertEqual(diagnostic.trace.line, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
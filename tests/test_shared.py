@@ -0,0 +1,75 @@
+"""
+tests of the look up tables of included files shared by the
+compilations of a batch, or of a compile server
+
+    python3 -m unittest discover tests
+"""
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+TESTS = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(TESTS)
+sys.path.insert(0, ROOT)
+
+import super_ini  # noqa: E402
+
+# warnings reported for common.ini, that both targets include
+WARNINGS = ['W02', 'W00']
+
+
+class BatchTest(unittest.TestCase):
+
+    def test_shared_warnings(self):
+        printed = subprocess.check_output(
+            [sys.executable, os.path.join(ROOT, 'super_ini.py'),
+             '--batch', os.devnull, 'shared_a.ini', '--dump',
+             'shared_b.ini', '--dump'],
+            cwd=TESTS, stderr=subprocess.STDOUT).decode()
+
+        targets = printed.split('shared_b.ini:')
+        self.assertEqual(len(targets), 2)
+        for printed in targets:
+            self.assertEqual([code for code in WARNINGS
+                              if '[' + code + ']' in printed], WARNINGS)
+
+
+class ServerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.socket_path = os.path.join(self.directory, 'server.sock')
+
+        server = subprocess.Popen(
+            [sys.executable, os.path.join(ROOT, 'super_ini.py'),
+             '--serve', self.socket_path],
+            stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        self.addCleanup(server.wait)
+        self.addCleanup(server.terminate)
+        # the server prints once it listens on the socket
+        self.assertIn(b'listening on', server.stdout.readline() +
+                      server.stdout.readline())
+        self.addCleanup(server.stdout.close)
+
+        # requests are compiled in the working directory of the client
+        cwd = os.getcwd()
+        os.chdir(TESTS)
+        self.addCleanup(os.chdir, cwd)
+
+    def test_shared_warnings(self):
+        for name in ('shared_a', 'shared_b', 'shared_a'):
+            response = super_ini.request(
+                self.socket_path, name + '.ini',
+                os.path.join(self.directory, name + '.out'))
+            self.assertTrue(response['ok'])
+            self.assertEqual([d[d.index('[') + 1:d.index(']')]
+                              for d in response['diagnostics']], WARNINGS)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+"""
+tests of the look up table snapshots of included files
+
+    python3 -m unittest discover tests
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+from unittest import mock
+
+TESTS = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(TESTS))
+
+import super_ini  # noqa: E402
+
+
+class SnapshotTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.root = os.path.join(self.directory, 'root.ini')
+        include = os.path.join(self.directory, 'include.ini')
+        with open(self.root, 'w') as f:
+            f.write('[] :: internal, include :{0}\n'.format(include))
+        with open(include, 'w') as f:
+            f.write('[a]\nx = 1 = 2\n')
+
+    def warnings(self, env: dict = None) -> list:
+        """compiles the root file, returns its warnings"""
+        compiler = super_ini.Compiler(env)
+        compiler.compile(self.root)
+        return [str(d) for d in compiler.diagnostics]
+
+    def test_warnings_replayed(self):
+        cold = self.warnings()
+        self.assertEqual(len(cold), 1)
+        self.assertIn('W02', cold[0])
+        self.assertTrue(os.path.isfile(os.path.join(
+            self.directory, '__inicache__', 'include.ini.lut')))
+        self.assertEqual(self.warnings(), cold)
+
+    def test_worker_warnings(self):
+        cold = self.warnings({'jobs': 2})
+        self.assertEqual(len(cold), 1)
+        self.assertEqual(self.warnings({'jobs': 2}), cold)
+
+    def test_include_error(self):
+        include = os.path.join(self.directory, 'include.ini')
+        with open(include, 'w') as f:
+            f.write('[a]\nx = 1 = 2\ny = b::z\nz: i32 = abc\n')
+        for _ in range(2):
+            compiler = super_ini.Compiler()
+            with self.assertRaises(super_ini.CompileError):
+                compiler.compile(self.root)
+            self.assertEqual([d.code for d in compiler.diagnostics],
+                             ['W02', 'W00', 'E07'])
+            self.assertEqual(compiler.recordings, [])
+
+    def test_concurrent_writers(self):
+        include = os.path.join(self.directory, 'include.ini')
+        st = os.stat(include)
+        with super_ini.Compiler() as compiler:
+            lut = super_ini.build_file(include)
+            warnings = super_ini.dump_warnings(compiler.diagnostics)
+
+        # a second writer writes the same snapshot while the first one
+        # is about to replace it
+        replace = os.replace
+        sources = []
+
+        def interleaved(src, dst):
+            sources.append(src)
+            if len(sources) == 1:
+                super_ini.write_snapshot(include, st, lut, warnings)
+            replace(src, dst)
+
+        with mock.patch.object(super_ini.os, 'replace', interleaved):
+            super_ini.write_snapshot(include, st, lut, warnings)
+        self.assertEqual(len(set(sources)), 2)
+        snapshot = super_ini.snapshot_path(include)
+        self.assertEqual(os.listdir(os.path.dirname(snapshot)),
+                         ['include.ini.lut'])
+        with super_ini.Compiler() as compiler:
+            self.assertIsNotNone(super_ini.load_snapshot(include, st))
+        self.assertEqual(len(compiler.diagnostics), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+"""
+tests of the incremental recompilation of watched files, the watcher
+is checked for changes directly instead of polling the files
+
+    python3 -m unittest discover tests
+"""
+
+import contextlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+TESTS = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(TESTS))
+
+import super_ini  # noqa: E402
+
+
+class WatchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.root = os.path.join(self.directory, 'root.ini')
+        self.include = os.path.join(self.directory, 'include.ini')
+        self.output = os.path.join(self.directory, 'out.ini')
+        with open(self.root, 'w') as f:
+            f.write('[0] :: internal, include :{0}\n\n'
+                    '[Prices]\nmelltith = 1200\n'.format(self.include))
+        with open(self.include, 'w') as f:
+            f.write('[Stats] :: internal\nweight: f32 = 3.5\n\n'
+                    '[Armor]\nweight = Stats::weight\n\n'
+                    '[Shields]\nweight = 2.0\n')
+        self.watcher = super_ini.Watcher(self.root, self.output, {})
+
+    def edit(self, path: str, old: str, new: str):
+        """replaces text in a file, its modification time is moved
+        forward so the change is seen even when its size is the same
+        """
+        with open(path, 'r') as f:
+            src = f.read()
+        with open(path, 'w') as f:
+            f.write(src.replace(old, new))
+        st = os.stat(path)
+        os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+
+    def check(self) -> str:
+        """checks the watched files, returns what was printed"""
+        printed = io.StringIO()
+        with contextlib.redirect_stdout(printed):
+            self.watcher.check()
+        self.assertFalse(self.watcher.failed)
+        return printed.getvalue()
+
+    def compiled(self) -> dict:
+        with super_ini.load(self.output) as compiled:
+            return dict((scope_id, dict(scope))
+                        for scope_id, scope in compiled.items())
+
+    def test_incremental(self):
+        self.assertIn('compiled 4 objects', self.check())
+        self.assertEqual(self.compiled()['Armor'], {'weight': '3.5'})
+        # nothing changed, nothing is resolved or written
+        printed = self.check()
+        self.assertNotIn('resolved', printed)
+        self.assertIn('is up to date', printed)
+
+        node = os.path.realpath(self.include)
+        parsed = self.watcher.compiler.include_graph.parsed
+        shields = parsed[node]['Shields']
+
+        # Armor references Stats, Shields keeps its resolved scope
+        self.edit(self.include, '3.5', '4.5')
+        printed = self.check()
+        self.assertIn('resolved 2 of 4 objects in ' + self.include, printed)
+        self.assertIs(parsed[node]['Shields'], shields)
+        compiled = self.compiled()
+        self.assertEqual(compiled['Armor'], {'weight': '4.5'})
+        self.assertEqual(compiled['Shields'], {'weight': '2.0'})
+
+        self.edit(self.root, '1200', '1300')
+        printed = self.check()
+        self.assertIn('resolved 1 of 3 objects in ' + self.root, printed)
+        self.assertIs(parsed[node]['Shields'], shields)
+        self.assertEqual(self.compiled()['Prices'], {'melltith': '1300'})
+
+    def test_include_changed(self):
+        self.check()
+        # scopes that call include recompile every file
+        self.edit(self.root, '[0] :: internal', '[1] :: internal')
+        printed = self.check()
+        self.assertNotIn('resolved', printed)
+        self.assertIn('compiled 4 objects', printed)
+
+
+if __name__ == '__main__':
+    unittest.main()